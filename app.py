@@ -1,8 +1,11 @@
-import sys
-import os
+import json, os, time, uuid
+from pathlib import Path
 import streamlit as st
-import uuid
 from modules import security
+from modules.metrics import metrics, span
+from modules.ui import hero, kpi_card, scope_badge, section_title, success_toast, warn_toast, ward_grid
+
+_page_t0 = time.perf_counter()
 
 st.set_page_config(page_title="VitalGuard MCP", page_icon="🏥", layout="wide")
 
@@ -12,111 +15,160 @@ if getattr(security, "DEMO_MODE", False):
 else:
     st.success("🔒 Secure mode enabled — OAuth required.")
 
-import json, pandas as pd, numpy as np, matplotlib.pyplot as plt, uuid, time
-from pathlib import Path
+# ---- Load CSS (read once per server process) ----
+css_path = Path(__file__).resolve().parent / "assets" / "theme.css"
 
-# ---- Drop-in JSON loader (Option 2) ----
-DATA_FILE = Path(__file__).resolve().parent / "data" / "vitals.json"
+@st.cache_resource
+def load_css(path=css_path):
+    return path.read_text() if path.exists() else None
 
-def load_vitals(file_path=DATA_FILE):
-    try:
-        with open(file_path, "r") as f:
-            raw = json.load(f)
-
-        rows = []
-        for patient_id, records in raw.items():
-            for r in records:
-                rows.append({
-                    "patient_id": patient_id,
-                    "timestamp": pd.to_datetime(r["timestamp"]),
-                    "heart_rate": r["heart_rate"],
-                    "spo2": r["spo2"],
-                    "bp": r["bp"],
-                    "temp": r["temp"],
-                })
-        return pd.DataFrame(rows)
-
-    except (FileNotFoundError, json.JSONDecodeError):
-        return pd.DataFrame([])
+css = load_css()
+if css is not None:
+    st.markdown(f"<style>{css}</style>", unsafe_allow_html=True)
+else:
+    st.warning(f"CSS file not found: {css_path}")
 
-def save_vitals(df, file_path=DATA_FILE):
-    grouped = {}
-    for _, row in df.iterrows():
-        pid = row["patient_id"]
-        grouped.setdefault(pid, []).append({
-            "timestamp": row["timestamp"].strftime("%Y-%m-%d %H:%M"),
-            "heart_rate": row["heart_rate"],
-            "spo2": row["spo2"],
-            "bp": row["bp"],
-            "temp": row["temp"]
-        })
-    with open(file_path, "w") as f:
-        json.dump(grouped, f, indent=4)
-
-# ---- Other imports (unchanged) ----
-from modules.security import OAuthGateway, require_scope, ConsentManager
-from modules.mcp import MCPRegistry, ToolCallResult
-from modules.analytics import AuditLog, export_logs_csv
-from modules.ui import hero, kpi_card, scope_badge, section_title, success_toast, warn_toast
+# ---- Header (drawn before the heavy imports and the data load below) ----
+hero(title="VitalGuard MCP", subtitle="Secure Healthcare IoT Server for AI Agents", badge="MCP + OAuth (simulated)")
 
-# ---- Load CSS ----
-css_path = Path(__file__).resolve().parent / "assets" / "theme.css"
+# ---- Columnar vitals store (converted once from the legacy JSON file) ----
+DATA_FILE = Path(__file__).resolve().parent / "data" / "vitals.json"
+STORE_DIR = DATA_FILE.parent / "vitals_store"
+AUDIT_DIR = DATA_FILE.parent / "audit"
+CONSENT_DB = DATA_FILE.parent / "consent.db"
+ALERTS_FILE = DATA_FILE.parent / "alerts.jsonl"
+PATIENTS_FILE = DATA_FILE.parent / "patients.csv"
+AUDIT_VIEW_ROWS = 500
+TREND_WINDOW_SECONDS = 30 * 60
+SHARDS = int(os.environ.get("VITALGUARD_SHARDS", "0"))   # >0: serve vitals from that many worker processes
+
+# pandas (and numpy) load here, after the first paint; matplotlib only on the first chart render.
+import pandas as pd
+from modules.store import VitalsStore, convert_json
+from modules.cache import get_cache
+
+def open_store(file_path=DATA_FILE, store_dir=STORE_DIR):
+    store = VitalsStore(store_dir)
+    if not store.exists() and Path(file_path).exists():
+        try:
+            store = convert_json(file_path, store_dir)
+        except (json.JSONDecodeError, KeyError, ValueError):
+            pass
+    return store
+
+def load_vitals(file_path=DATA_FILE, store_dir=STORE_DIR):
+    store = open_store(file_path, store_dir)
+    if not store.exists():
+        return pd.DataFrame([])
+    # process-wide cache shared by all sessions; re-reads only changed patients
+    return get_cache(store_dir).repository().to_frame()
 
-if css_path.exists():
-    st.markdown(f"<style>{css_path.read_text()}</style>", unsafe_allow_html=True)
-else:
-    st.warning(f"CSS file not found: {css_path}")
+def append_vitals(df, store_dir=STORE_DIR):
+    # Append-only: writes just the new readings to each patient's WAL segment.
+    return VitalsStore(store_dir).append_frame(df)
+
+# ---- Other imports ----
+from modules.security import OAuthGateway, require_scope, ConsentManager, PURPOSE_NOTIFY
+from modules.mcp import MCPRegistry, ToolCallResult
+from modules.analytics import AuditLog, export_logs, EXPORT_FORMATS
+from modules import thresholds
+from modules.charts import chart_cache
+from modules.alerts import AlertDispatcher, FileSink
+from modules.patients import PatientCatalog
+from modules.query import QueryEngine
+
+# One alert queue per server process: deduplicates repeated alerts across reruns and sessions.
+@st.cache_resource
+def get_dispatcher():
+    return AlertDispatcher(FileSink(ALERTS_FILE))
+
+# Vitals source: the in-process cache, or a pool of shard workers when VITALGUARD_SHARDS is set.
+@st.cache_resource
+def get_vitals():
+    if SHARDS > 0:
+        from modules.shards import ShardPool
+        return ShardPool(STORE_DIR, SHARDS)
+    return get_cache(STORE_DIR)
+
+# Demographics from patients.csv joined with the shared vitals source; one per server process.
+@st.cache_resource
+def get_catalog():
+    return PatientCatalog(PATIENTS_FILE, vitals=get_vitals())
+
+# Chatbot queries answered from a per-data-version index; answers are shared by all sessions.
+@st.cache_resource
+def get_query_engine():
+    return QueryEngine(get_vitals(), get_catalog())
+
+# One long-lived registry per server process, serving vitals from the shared source.
+@st.cache_resource
+def get_registry():
+    return MCPRegistry(vitals=get_vitals(), patients=get_catalog(),
+                       consent=ConsentManager(CONSENT_DB), alerts=get_dispatcher())
 
 # ---- Session State ----
 if "oauth" not in st.session_state:
     st.session_state.oauth = OAuthGateway()
 if "audit" not in st.session_state:
-    st.session_state.audit = AuditLog()
+    st.session_state.audit = AuditLog(path=AUDIT_DIR)
 if "consent" not in st.session_state:
-    st.session_state.consent = ConsentManager()
+    st.session_state.consent = ConsentManager(CONSENT_DB)
 
 # ---- Data ----
-data = load_vitals(DATA_FILE)
-
-# ---- Header ----
-hero(title="VitalGuard MCP", subtitle="Secure Healthcare IoT Server for AI Agents", badge="MCP + OAuth (simulated)")
+open_store(DATA_FILE)
+# Per-patient reads only: in shard mode each one is a call to the owning worker.
+vitals = get_vitals()
+catalog = get_catalog()
 
 # ---- Tabs ----
-tabs = st.tabs(["🏠 Dashboard", "🛡️ Security & Scopes", "🧾 Audit Logs", "⚙️ Settings", "ℹ️ About"])
+tabs = st.tabs(["🏠 Dashboard", "🛡️ Security & Scopes", "🧾 Audit Logs", "📈 Performance", "⚙️ Settings", "ℹ️ About"])
 
 # -------------------- Dashboard --------------------
 with tabs[0]:
+    if st.sidebar.checkbox("🏥 Ward overview", value=False):
+        section_title("Ward Overview")
+        status = vitals.ward_status()
+        n_crit = int((status["level"] >= thresholds.CRITICAL).sum())
+        n_warn = int((status["level"] == thresholds.WARNING).sum())
+        st.caption(f"{len(status)} patients · 🔴 {n_crit} critical · 🟠 {n_warn} warning")
+        st.session_state.ward_prev = ward_grid(status, st.session_state.get("ward_prev"))
+
     section_title("Patient Monitoring")
     colL, colR = st.columns([1, 2], gap="large")
 
     with colL:
         # Always DataFrame now
-        patient_ids = data["patient_id"].unique().tolist() if not data.empty else []
-        patient_id = st.sidebar.selectbox("Select Patient", patient_ids)
+        patient_ids = vitals.patient_ids()
+        patient_id = st.sidebar.selectbox("Select Patient", patient_ids, format_func=catalog.label)
 
         st.write("Available IDs:", patient_ids)
         st.write("Selected ID:", patient_id)
 
-        patient = data[data["patient_id"] == patient_id].to_dict(orient="records")
+        # only the newest reading is needed here; the trend reads just its window
+        with span("patient_filter"):
+            latest = vitals.latest(patient_id) if patient_id is not None else None
 
-        if not patient:
+        if latest is None:
             st.error(f"❌ Patient {patient_id} not found!")
             st.stop()
 
         st.markdown('<div class="vg-card">', unsafe_allow_html=True)
-        kpi_card("Patient", patient_id)
+        info = catalog.demographics(patient_id)
+        kpi_card("Patient", catalog.label(patient_id))
+        if info is not None:
+            kpi_card("Profile", f"{info.age or '?'} · {info.gender or '?'} · {info.condition or '—'}")
         kpi_card("Auth Status", "Connected" if hasattr(st.session_state, "oauth") and st.session_state.oauth.token else "Not Connected")
         st.markdown('</div>', unsafe_allow_html=True)
 
     with colR:
         cols = st.columns(4)
-        latest = patient[-1]  # last record for this patient
-        v = latest  # alias for clarity
+        v = latest  # last record for this patient
 
         # >>> Conditional color alerts on KPI cards
-        hr_color = "🔴" if v["heart_rate"] > 120 else "🟢"
-        spo2_color = "🔴" if v["spo2"] < 95 else "🟢"
-        temp_color = "🔴" if v["temp"] > 38 else "🟢"
+        levels = dict(zip(thresholds.VITALS, thresholds.check_reading(v)))
+        hr_color = "🔴" if levels["heart_rate"] else "🟢"
+        spo2_color = "🔴" if levels["spo2"] else "🟢"
+        temp_color = "🔴" if levels["temp"] else "🟢"
         bp_color = "🟢"
 
         kpi_card(f"{hr_color} Heart Rate", f"{v['heart_rate']} bpm", cols[0])
@@ -126,32 +178,31 @@ with tabs[0]:
 
         st.markdown('<div class="vg-card">', unsafe_allow_html=True)
         st.write("### Trend (last 30 minutes)")
-        if len(patient) > 0:
-            df = pd.DataFrame(patient)
-            fig = plt.figure()
-            plt.plot(pd.to_datetime(df["timestamp"]), df["heart_rate"], label="Heart Rate")
-            plt.plot(pd.to_datetime(df["timestamp"]), df["spo2"], label="SpO2")
-            plt.plot(pd.to_datetime(df["timestamp"]), df["temp"], label="Temp (°C)")
-            plt.legend()
-            plt.xlabel("Time"); plt.ylabel("Value")
-            st.pyplot(fig)
-            plt.close(fig)
+        # version read before the data: a cached chart is never older than its key
+        version = vitals.version()
+        with span("patient_filter", window="30m"):
+            recent = vitals.recent(patient_id, TREND_WINDOW_SECONDS)
+        if len(recent) > 0:
+            png = chart_cache.trend_png((patient_id, TREND_WINDOW_SECONDS, version), recent)
+            st.image(png, use_column_width=True)
+
+            trend = vitals.trend(patient_id, "30m")
+            if trend is not None:
+                st.caption(f"Early-warning score: **{trend['ews']}**")
+                st.dataframe(pd.DataFrame(trend["stats"]).T, use_container_width=True)
         else:
             st.info("No history available for this patient.")
         st.markdown('</div>', unsafe_allow_html=True)
 
         # Threshold checks (manual + auto)
         if st.button("🧪 Check Thresholds"):
-            alerts = []
-            if v["spo2"] < 95: alerts.append("Low SpO₂ detected")
-            if v["heart_rate"] > 120: alerts.append("High heart rate detected")
-            if v["temp"] > 38: alerts.append("High fever detected")
+            alerts = thresholds.messages(levels.values())
 
             st.session_state.audit.add(
                 action="check_thresholds",
                 subject=patient_id,
                 status="ok",
-                scopes=st.session_state.oauth.scopes(),
+                scopes=st.session_state.oauth.scopes_str(),
             )
 
             if alerts:
@@ -160,41 +211,43 @@ with tabs[0]:
             else:
                 success_toast("Vitals are within safe limits ✅")
 
-        auto_alerts = []
-        if v["spo2"] < 90: auto_alerts.append("🚨 CRITICAL: SpO₂ dangerously low!")
-        if v["heart_rate"] > 130: auto_alerts.append("🚨 CRITICAL: Severe tachycardia!")
-        if v["temp"] > 39.5: auto_alerts.append("🚨 CRITICAL: High-grade fever!")
+        auto_alerts = thresholds.messages(levels.values(), thresholds.CRITICAL)
 
         if auto_alerts:
             for a in auto_alerts:
                 st.error(a)
-            st.session_state.audit.add(
-                action="auto_threshold_alert",
-                subject=patient_id,
-                status="triggered",
-                scopes=st.session_state.oauth.scopes(),
-            )
+            # queued once per dedup window, not on every rerun while the patient stays critical
+            if get_dispatcher().submit(patient_id, " | ".join(auto_alerts), kind="auto_threshold") == "queued":
+                st.session_state.audit.add(
+                    action="auto_threshold_alert",
+                    subject=patient_id,
+                    status="triggered",
+                    scopes=st.session_state.oauth.scopes_str(),
+                )
+        else:
+            get_dispatcher().clear(patient_id, kind="auto_threshold")
 
         # alert doctor
         message = st.text_input("Message to Doctor", "Critical condition detected")
         if st.button("📨 Alert Doctor (requires consent & scope)"):
             try:
                 require_scope(st.session_state.oauth, "alerts:write")
-                consent_ok = st.session_state.consent.has_consent(patient_id)
+                consent_ok = st.session_state.consent.has_consent(patient_id, PURPOSE_NOTIFY)
                 if not consent_ok:
                     with st.expander("Consent required"):
                         st.write("Please capture patient consent before notifying a doctor.")
                         if st.button("✅ Capture consent now"):
-                            st.session_state.consent.capture(patient_id, "Notify doctor about current condition.")
+                            st.session_state.consent.capture(patient_id, PURPOSE_NOTIFY, "Notify doctor about current condition.")
                             success_toast("Consent captured")
                 # re-check consent
-                if st.session_state.consent.has_consent(patient_id):
-                    st.success(f"Doctor notified for {patient['name']} with message: {message}")
+                if st.session_state.consent.has_consent(patient_id, PURPOSE_NOTIFY):
+                    get_dispatcher().submit(patient_id, message, kind="manual", dedup=False)
+                    st.success(f"Doctor notified for {patient_id} with message: {message}")
                     st.session_state.audit.add(
                         action="alert_doctor",
                         subject=patient_id,
                         status="sent",
-                        scopes=st.session_state.oauth.scopes(),
+                        scopes=st.session_state.oauth.scopes_str(),
                     )
                 else:
                     st.warning("Consent not captured. Action blocked.")
@@ -204,7 +257,7 @@ with tabs[0]:
                     action="alert_doctor",
                     subject=patient_id,
                     status="forbidden",
-                    scopes=st.session_state.oauth.scopes(),
+                    scopes=st.session_state.oauth.scopes_str(),
                 )
 
 # -------------------- Security & Scopes --------------------
@@ -241,31 +294,75 @@ with tabs[1]:
 with tabs[2]:
     section_title("Audit & Observability")
     st.markdown('<div class="vg-card">', unsafe_allow_html=True)
-    df = st.session_state.audit.as_dataframe()
+    df = st.session_state.audit.as_dataframe(limit=AUDIT_VIEW_ROWS)
     if df is not None and len(df) > 0:
         st.dataframe(df, use_container_width=True, height=360)
-        st.download_button(
-            "⬇️ Download audit_logs.csv",
-            data=export_logs_csv(df),
-            file_name="audit_logs.csv",
-            mime="text/csv"
-)
+
+        # Export streams from the persisted segments, filtered while reading.
+        ex1, ex2, ex3 = st.columns(3)
+        with ex1:
+            export_fmt = st.selectbox("Format", list(EXPORT_FORMATS), key="audit_export_fmt")
+        with ex2:
+            export_days = st.date_input("Date range", value=(), key="audit_export_days")
+        with ex3:
+            export_subjects = st.multiselect("Subjects", sorted(df["subject"].unique()), key="audit_export_subjects")
+
+        if st.button("📦 Prepare export"):
+            st.session_state.audit.flush()
+            start = end = None
+            if len(export_days) > 0:
+                start = pd.Timestamp(export_days[0])
+                end = pd.Timestamp(export_days[-1]) + pd.Timedelta(days=1) - pd.Timedelta(microseconds=1)
+            # Segments are read and encoded chunk by chunk, but download_button needs
+            # every byte up front, so the encoded export is held in memory once.
+            data = b"".join(export_logs(AUDIT_DIR, export_fmt, start, end, export_subjects))
+            st.download_button(
+                f"⬇️ Download audit_logs.{export_fmt}",
+                data=data,
+                file_name=f"audit_logs.{export_fmt}",
+                mime=EXPORT_FORMATS[export_fmt],
+            )
 
     else:
         st.info("No audit logs yet. Execute some actions first.")
     st.markdown('</div>', unsafe_allow_html=True)
 
-# -------------------- Settings --------------------
+# -------------------- Performance --------------------
 with tabs[3]:
+    section_title("Performance")
+    st.markdown('<div class="vg-card">', unsafe_allow_html=True)
+    st.caption("Latency histograms for this server process (all sessions). Percentiles are estimated from buckets.")
+    perf = metrics.summary()
+    if perf:
+        st.dataframe(pd.DataFrame(perf).round(3), use_container_width=True)
+        trace_filter = st.text_input("Filter recent spans by trace ID", key="perf_trace").strip() or None
+        st.dataframe(pd.DataFrame(metrics.recent(limit=100, trace_id=trace_filter)), use_container_width=True, height=280)
+        with st.expander("Prometheus text"):
+            st.code(metrics.render_prometheus(), language="text")
+        if st.button("♻️ Reset metrics"):
+            metrics.reset()
+    else:
+        st.info("No spans recorded yet.")
+    st.markdown('</div>', unsafe_allow_html=True)
+
+# -------------------- Settings --------------------
+with tabs[4]:
     section_title("Settings")
     st.write("You can extend this demo with real IoT data sources (e.g., Firebase, Blynk, MQTT).")
+    st.write("`modules.ingest` subscribes to `vitals/<patient_id>` streams and batches them into the vitals store; load-test it offline with the local broker and device simulator:")
+    st.code("python -m modules.ingest --store /tmp/vitals_store --patients 200 --rate 5000 --seconds 10", language="bash")
     st.write("Swap the simulated OAuth with a real **Cequence AI Gateway** in front of a FastAPI MCP server.")
+    st.write("Run the MCP tools headless (JSON-RPC over stdio or a local socket):")
+    st.code("python -m modules.server --stdio\npython -m modules.server --socket /tmp/vitalguard.sock --metrics-port 9108", language="bash")
+    st.write("Serve vitals from hash-partitioned worker processes with `VITALGUARD_SHARDS=4 streamlit run app.py` or `python -m modules.server --stdio --shards 4`.")
+    with st.expander("Vitals cache"):
+        st.json(vitals.stats())
 
 # -------------------- About --------------------
-with tabs[4]:
+with tabs[5]:
     section_title("About VitalGuard MCP")
     st.write("Built for the Global MCP Hackathon to demonstrate **secure, permissioned, and observable** agent-to-API interactions in healthcare.")
-    st.markdown("**MCP Tools implemented:** `get_vitals`, `check_thresholds`, `alert_doctor`")
+    st.markdown("**MCP Tools implemented:** `get_vitals`, `check_thresholds`, `get_trend`, `alert_doctor`")
     st.markdown("**Security:** OAuth-like token, scoped access, consent capture & replay, audit logs.")
     st.markdown("**UI:** Themed KPIs, animated badges, charts, trace IDs, and exportable logs.")
 
@@ -280,48 +377,21 @@ show_chatbot = st.sidebar.checkbox("Show Chatbot Panel", value=False)
 if show_agent_console:
     section_title("🤖 Agent Console (Sidebar Mode)")
 
-    registry = MCPRegistry()
+    registry = get_registry()
     st.markdown('<div class="vg-card">', unsafe_allow_html=True)
 
     st.write("### Execute Tool As Agent")
     tools = registry.list_tools()
     tool = st.selectbox("Tool", [t["name"] for t in tools], key="sidebar_tool")
 
-    import numpy as np, uuid
-
-   # ✅ Works with DataFrame instead of dict
-    def get_patient(pid: str):
-        if pid in data["id"].values:  # check patient IDs column
-            row = data[data["id"] == pid].iloc[0]
-            return {
-                "name": row.get("name", f"Patient {pid}"),
-                "age": int(row.get("age", np.random.randint(20, 80))),
-                "gender": row.get("gender", np.random.choice(["M", "F"])),
-                "vitals": {
-                    "HR": int(row.get("HR", np.random.randint(60, 100))),
-                    "BP": row.get("BP", f"{np.random.randint(110,130)}/{np.random.randint(70,85)}"),
-                    "SpO2": int(row.get("SpO2", np.random.randint(95, 100)))
-                }
-            }
-        else:
-            # Auto-generate a fallback patient if not found
-            return {
-                "name": f"AutoGen {pid}",
-                "age": np.random.randint(20, 80),
-                "gender": np.random.choice(["M", "F"]),
-                "vitals": {"HR": np.random.randint(60, 100),
-                           "BP": f"{np.random.randint(110,130)}/{np.random.randint(70,85)}",
-                           "SpO2": np.random.randint(95, 100)}
-            }
-    
-    def get_patient_ids(df):
-        return df["id"].tolist()  # ✅ extract from column
-
-    valid_ids = get_patient_ids(data)
-    patient_id = st.selectbox("Patient", valid_ids, key="sidebar_agent_patient")
-
-    # Fetch patient details
-    patient = get_patient(patient_id)
+    valid_ids = catalog.ids()
+    patient_id = st.selectbox("Patient", valid_ids, format_func=catalog.label, key="sidebar_agent_patient")
+
+    # Demographics + latest vitals, one lookup in the shared catalog
+    patient = catalog.get(patient_id)
+    if patient is not None:
+        st.caption(f"{patient['name']} · {patient['age'] or '?'} · {patient['gender'] or '?'} · {patient['condition'] or '—'}"
+                   + ("" if patient["vitals"] else " · no vitals recorded"))
 
     prompt = st.text_input("Agent Instruction", "Check thresholds and alert doctor if risky.", key="sidebar_prompt")
 
@@ -329,21 +399,7 @@ if show_agent_console:
         trace_id = str(uuid.uuid4())[:8]
         st.write(f"Trace ID: `{trace_id}`")
 
-        kwargs = dict(
-            tool_name=tool,
-            patient_id=patient_id,
-            data=patient,  # ✅ pass single patient dict instead of undefined `data`
-            oauth=st.session_state.get("oauth"),
-            consent=st.session_state.get("consent"),
-            audit=st.session_state.get("audit"),
-            prompt=prompt,
-        )
-
-        import inspect
-        sig = inspect.signature(registry.execute)
-        supported = {k: v for k, v in kwargs.items() if k in sig.parameters}
-
-        result: ToolCallResult = registry.execute(**supported)
+        result: ToolCallResult = registry.execute(tool, patient_id=patient_id, prompt=prompt, trace_id=trace_id)
 
         if result.ok:
             st.success(result.message)
@@ -352,6 +408,15 @@ if show_agent_console:
         else:
             st.error(result.message)
 
+    if st.button("⏩ Run on all patients (batch)"):
+        trace_id = uuid.uuid4().hex[:8]
+        st.write(f"Trace ID: `{trace_id}`")
+        results = registry.execute_many(tool, valid_ids, prompt=prompt, trace_id=trace_id)
+        st.dataframe(pd.DataFrame([
+            {"patient_id": pid, "ok": r.ok, "message": r.message, "payload": str(r.payload or "")}
+            for pid, r in zip(valid_ids, results)
+        ]), use_container_width=True)
+
     st.markdown('</div>', unsafe_allow_html=True)
 
 
@@ -367,31 +432,20 @@ if show_chatbot:
 
     if st.button("Send", key="chat_send"):
         if user_input:
-            # very simple heuristic "chatbot" on vitals data
-            response = "I couldn’t understand your question."
-
-            if "list patients" in user_input.lower():
-                ids = data["patient_id"].unique().tolist()
-                response = f"Patients available: {', '.join(ids)}"
-
-            elif "latest vitals" in user_input.lower():
-                pid = st.sidebar.selectbox("Pick patient", data["patient_id"].unique(), key="chat_pid")
-                latest = data[data["patient_id"] == pid].iloc[-1].to_dict()
-                response = f"Latest vitals for {pid}: {latest}"
-
-            elif "critical" in user_input.lower():
-                critical = data[(data["spo2"] < 90) | (data["heart_rate"] > 130)]
-                if not critical.empty:
-                    ids = critical["patient_id"].unique().tolist()
-                    response = f"Critical patients: {', '.join(ids)}"
-                else:
-                    response = "No patients in critical state."
+            # structured query over the latest-state / windowed ward index, cached per data version
+            trace_id = uuid.uuid4().hex[:8]
+            answer = get_query_engine().ask(user_input, trace_id=trace_id)
+            response = answer.text
 
-            st.session_state.chat_history.append({"user": user_input, "bot": response})
+            st.session_state.chat_history.append({"user": user_input, "bot": response, "trace_id": trace_id})
 
     # show history
     for chat in st.session_state.chat_history:
         st.write(f"👤 {chat['user']}")
         st.info(f"🤖 {chat['bot']}")
+        if chat.get("trace_id"):
+            st.caption(f"Trace ID: `{chat['trace_id']}`")
 
     st.markdown('</div>', unsafe_allow_html=True)
+
+metrics.observe("page_render", time.perf_counter() - _page_t0)
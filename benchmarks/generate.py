@@ -0,0 +1,105 @@
+import argparse, json, sys, time
+from pathlib import Path
+import numpy as np
+
+# Synthetic ward data for the benchmarks: patients.csv (tab-separated, same
+# columns as data/patients.csv) plus vitals either as the legacy vitals.json
+# or written straight into a columnar store (much faster for millions of rows).
+
+FIRST = ["Arjun", "Sai", "Ravi", "Meghana", "Kiran", "Anita", "Vikram", "Lakshmi", "Rahul", "Divya"]
+LAST = ["Mehta", "Priya", "Kumar", "Reddy", "Rao", "Sharma", "Iyer", "Nair", "Das", "Gupta"]
+CONDITIONS = ["Normal", "Hypertension", "Diabetes", "Cardiac", "COPD", "Post-op"]
+START = np.datetime64("2025-08-22T09:00:00", "s")
+INTERVAL_S = 60
+
+
+def patient_ids(n: int):
+    width = max(3, len(str(n)))
+    return [f"P{i:0{width}d}" for i in range(1, n + 1)]
+
+
+def vitals_columns(rng, n: int, start=START, interval_s: int = INTERVAL_S):
+    # One patient's readings as store columns: a random walk around a baseline,
+    # with ~2% of readings pushed into warning/critical ranges.
+    base_hr, base_spo2, base_sys = rng.integers(65, 105), rng.integers(93, 100), rng.integers(110, 150)
+    hr = base_hr + np.cumsum(rng.integers(-2, 3, n)).clip(-30, 40)
+    spo2 = (base_spo2 + rng.integers(-2, 2, n)).clip(80, 100)
+    spikes = rng.random(n) < 0.02
+    hr[spikes] += 35
+    spo2[spikes] -= 6
+    sys_ = base_sys + rng.integers(-8, 9, n)
+    ts = start + np.arange(n) * interval_s + rng.integers(0, interval_s, n) // 4
+    return {
+        "timestamp": ts.astype("datetime64[ns]").astype(np.int64),
+        "heart_rate": hr.astype(np.int16),
+        "spo2": spo2.astype(np.int16),
+        "bp_systolic": sys_.astype(np.int16),
+        "bp_diastolic": (sys_ * 2 // 3 + rng.integers(-5, 6, n)).astype(np.int16),
+        "temp": np.round(98.2 + rng.normal(0, 0.6, n) + spikes * 2.5, 1).astype(np.float32),  # °F, as in vitals.json
+    }
+
+
+def _records(cols):
+    ts = cols["timestamp"].astype("datetime64[ns]").astype("datetime64[s]").astype(str)
+    return [
+        {"timestamp": t.replace("T", " "), "heart_rate": int(h), "spo2": int(s), "bp": f"{int(a)}/{int(b)}", "temp": float(round(c, 1))}
+        for t, h, s, a, b, c in zip(ts, cols["heart_rate"], cols["spo2"], cols["bp_systolic"], cols["bp_diastolic"], cols["temp"])
+    ]
+
+
+def write_patients(path, ids, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    with open(path, "w") as f:
+        f.write("patient_id\tname\tage\tgender\tcondition\n")
+        for pid in ids:
+            f.write(f"{pid}\t{rng.choice(FIRST)} {rng.choice(LAST)}\t{rng.integers(18, 95)}\t"
+                    f"{rng.choice(['Male', 'Female'])}\t{rng.choice(CONDITIONS)}\n")
+
+
+def write_vitals_json(path, ids, readings: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    with open(path, "w") as f:
+        json.dump({pid: _records(vitals_columns(rng, readings)) for pid in ids}, f)
+
+
+def write_vitals_store(store_dir, ids, readings: int, seed: int = 0):
+    # Same readings as write_vitals_json, already normalized the way ingest stores them (°C).
+    from modules.readings import to_celsius
+    from modules.store import FIELDS, VitalsStore
+    rng = np.random.default_rng(seed)
+    store = VitalsStore(store_dir).init()
+    for pid in ids:
+        cols = vitals_columns(rng, readings)
+        cols["temp"] = to_celsius(cols["temp"]).astype(FIELDS["temp"])
+        store.write_patient(pid, cols)
+    store._bump_version()
+    return store
+
+
+def generate(out_dir, patients: int, readings: int, seed: int = 0, fmt: str = "json"):
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    ids = patient_ids(patients)
+    write_patients(out / "patients.csv", ids, seed)
+    if fmt in ("json", "both"):
+        write_vitals_json(out / "vitals.json", ids, readings, seed)
+    if fmt in ("store", "both"):
+        write_vitals_store(out / "vitals_store", ids, readings, seed)
+    return out
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Generate synthetic VitalGuard data")
+    p.add_argument("out", help="output directory")
+    p.add_argument("--patients", type=int, default=100)
+    p.add_argument("--readings", type=int, default=100, help="readings per patient")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--format", choices=["json", "store", "both"], default="json")
+    args = p.parse_args(argv)
+    t0 = time.perf_counter()
+    out = generate(args.out, args.patients, args.readings, args.seed, args.format)
+    print(f"{args.patients} patients x {args.readings} readings -> {out} ({time.perf_counter() - t0:.1f}s)")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,381 @@
+import argparse, gc, json, platform, statistics, subprocess, sys, tempfile, time, tracemalloc
+from pathlib import Path
+import numpy as np, pandas as pd
+
+from benchmarks.generate import generate, patient_ids
+from modules.store import VitalsStore, convert_json
+from modules.cache import VitalsCache
+from modules import thresholds
+from modules.analytics import AuditLog, export_logs, export_logs_csv, write_segments
+
+# Timing + peak-memory harness for the hot paths. Each benchmark is a setup
+# function returning the callable to measure; the callable is timed `repeat`
+# times (after one warm-up) and traced once more with tracemalloc for peak
+# allocations. Results are JSON so runs from different commits can be diffed:
+#
+#   python -m benchmarks.run --patients 1000 --readings 500 -o before.json
+#   python -m benchmarks.run --patients 1000 --readings 500 --compare before.json
+
+LOOKUPS = 100              # patients looked up per filter benchmark
+AUDIT_EVENTS = 10_000
+MESSAGES = 10_000          # device payloads per validation benchmark
+EXPORT_EVENTS = 100_000
+JSON_MAX_ROWS = 2_000_000  # above this the legacy JSON benchmarks are skipped
+TOLERANCE = 0.20           # relative slowdown of the median reported as a regression
+
+BENCHMARKS = {}
+
+
+def bench(name):
+    def register(fn):
+        BENCHMARKS[name] = fn
+        return fn
+    return register
+
+
+class Context:
+    def __init__(self, root: Path, patients: int, readings: int, seed: int):
+        self.root, self.patients, self.readings = root, patients, readings
+        self.json_path = root / "vitals.json"
+        self.store = VitalsStore(root / "vitals_store")
+        self.rng = np.random.default_rng(seed)
+        self.ids = patient_ids(patients)
+        self._repo = self._frame = None
+
+    @property
+    def repo(self):
+        if self._repo is None:
+            self._repo = VitalsCache(self.store).repository()
+        return self._repo
+
+    @property
+    def frame(self):
+        # every reading as one frame, for the legacy whole-frame baselines
+        if self._frame is None:
+            self._frame = self.repo.to_frame()
+        return self._frame
+
+    def sample_ids(self):
+        return list(self.rng.choice(self.ids, size=min(LOOKUPS, len(self.ids)), replace=False))
+
+
+# ---- Load ----
+@bench("load_json")
+def _load_json(ctx):
+    # Legacy path: parse vitals.json and flatten it into one DataFrame.
+    if not ctx.json_path.exists():
+        return None
+
+    def run():
+        with open(ctx.json_path) as f:
+            raw = json.load(f)
+        rows = [dict(r, patient_id=pid) for pid, recs in raw.items() for r in recs]
+        return pd.DataFrame(rows)
+    return run
+
+
+@bench("convert_json")
+def _convert_json(ctx):
+    if not ctx.json_path.exists():
+        return None
+    return lambda: convert_json(ctx.json_path, ctx.root / "vitals_store.bench")
+
+
+@bench("load_store_cold")
+def _load_store_cold(ctx):
+    return lambda: VitalsCache(VitalsStore(ctx.store.root)).repository()
+
+
+@bench("load_store_warm")
+def _load_store_warm(ctx):
+    cache = VitalsCache(VitalsStore(ctx.store.root))
+    cache.repository()
+    return cache.repository
+
+
+@bench("ward_status_cold")
+def _ward_status_cold(ctx):
+    # Dashboard start: latest rows of every patient from the store tails, no histories.
+    return lambda: VitalsCache(VitalsStore(ctx.store.root)).ward_status()
+
+
+@bench("load_store_bump")
+def _load_store_bump(ctx):
+    # A new reading for one patient per call: only that patient is re-read and spliced in.
+    import shutil
+    root = ctx.root / "vitals_store.bump"
+    shutil.rmtree(root, ignore_errors=True)
+    shutil.copytree(ctx.store.root, root)
+    store = VitalsStore(root)
+    cache = VitalsCache(store)
+    pid = ctx.ids[0]
+    row = {f: v[-1:].copy() for f, v in store.read_columns(pid).items()}
+
+    def run():
+        row["timestamp"] += 10**9
+        store.append(pid, row)
+        return cache.repository()
+    cache.repository()
+    return run
+
+
+# ---- Ingest validation ----
+@bench("validate_messages")
+def _validate_messages(ctx):
+    # One pydantic parse + validation per device payload (JSON bytes).
+    from modules.ingest import normalize
+    rows = ctx.frame.head(MESSAGES)
+    payloads = [
+        json.dumps({"patient_id": p, "timestamp": str(t), "heart_rate": int(h), "spo2": int(s),
+                    "bp": f"{a}/{b}", "temp": float(c)}).encode()
+        for p, t, h, s, a, b, c in zip(rows["patient_id"], rows["timestamp"], rows["heart_rate"], rows["spo2"],
+                                       rows["bp_systolic"], rows["bp_diastolic"], rows["temp"])
+    ]
+    return lambda: [normalize("vitals/+", p) for p in payloads]
+
+
+@bench("validate_frame")
+def _validate_frame(ctx):
+    # Bulk path: a JSON-layout frame ("bp" strings) to validated store columns.
+    from modules.store import frame_to_columns
+    frame = ctx.frame
+    df = pd.DataFrame({
+        "timestamp": frame["timestamp"], "heart_rate": frame["heart_rate"], "spo2": frame["spo2"],
+        "bp": frame["bp_systolic"].astype(str) + "/" + frame["bp_diastolic"].astype(str), "temp": frame["temp"],
+    })
+    return lambda: frame_to_columns(df)
+
+
+# ---- Per-patient filtering ----
+@bench("filter_mask")
+def _filter_mask(ctx):
+    frame, ids = ctx.frame, ctx.sample_ids()
+    return lambda: [frame[frame["patient_id"] == pid] for pid in ids]
+
+
+@bench("filter_repository")
+def _filter_repository(ctx):
+    repo, ids = ctx.repo, ctx.sample_ids()
+    return lambda: [repo.history(pid) for pid in ids]
+
+
+@bench("read_patient_store")
+def _read_patient_store(ctx):
+    ids = ctx.sample_ids()
+    return lambda: [ctx.store.read(pid) for pid in ids]
+
+
+# ---- Thresholds ----
+@bench("thresholds_all_rows")
+def _thresholds_all_rows(ctx):
+    frame = ctx.frame
+    return lambda: thresholds.evaluate(frame)
+
+
+@bench("thresholds_ward")
+def _thresholds_ward(ctx):
+    latest = ctx.repo.latest_frame()
+    return lambda: thresholds.ward_status(latest)
+
+
+# ---- Chatbot queries ----
+def _query_engine(ctx):
+    from modules.query import QueryEngine
+    engine = QueryEngine(VitalsCache(VitalsStore(ctx.store.root)))
+    engine._ward()
+    return engine
+
+
+@bench("query_ward_mask")
+def _query_ward_mask(ctx):
+    # Legacy chatbot: boolean masks over every historical reading.
+    frame = ctx.frame
+    return lambda: frame[(frame["spo2"] < 90) | (frame["heart_rate"] > 130)]["patient_id"].unique()
+
+
+@bench("query_ward_window")
+def _query_ward_window(ctx):
+    from modules.query import parse
+    engine, q = _query_engine(ctx), parse("critical patients in the last hour")
+
+    def run():
+        engine._results.clear()  # measure the answer, not the result cache
+        return engine.run(q)
+    return run
+
+
+@bench("query_ward_cached")
+def _query_ward_cached(ctx):
+    engine = _query_engine(ctx)
+    return lambda: engine.ask("patients with spo2 < 90 or hr > 130")
+
+
+# ---- Audit log ----
+def _filled_log(n):
+    log = AuditLog(capacity=n)
+    for i in range(n):
+        log.add("get_vitals", f"P{i % 1000:03d}", "ok", "vitals:read")
+    return log
+
+
+@bench("audit_add")
+def _audit_add(ctx):
+    log = AuditLog(capacity=AUDIT_EVENTS)
+    return lambda: [log.add("get_vitals", "P001", "ok", "vitals:read") for _ in range(AUDIT_EVENTS)]
+
+
+@bench("audit_as_dataframe")
+def _audit_as_dataframe(ctx):
+    log = _filled_log(AUDIT_EVENTS)
+
+    def run():
+        log.add("get_vitals", "P001", "ok", "vitals:read")  # defeat the cached view
+        return log.as_dataframe()
+    return run
+
+
+@bench("export_logs_csv")
+def _export_logs_csv(ctx):
+    df = _filled_log(AUDIT_EVENTS).as_dataframe()
+    return lambda: export_logs_csv(df)
+
+
+def _audit_segments(ctx):
+    directory = ctx.root / "audit"
+    if not directory.exists():
+        directory.mkdir()
+        t0 = time.time() - 3 * 86400
+        write_segments(directory, [
+            (t0 + i * 3 * 86400 / EXPORT_EVENTS, f"{i:08x}", "get_vitals", f"P{i % 1000:03d}", "ok", "vitals:read")
+            for i in range(EXPORT_EVENTS)
+        ])
+    return directory
+
+
+@bench("export_stream_csv")
+def _export_stream_csv(ctx):
+    directory = _audit_segments(ctx)
+    return lambda: sum(len(c) for c in export_logs(directory, "csv"))
+
+
+@bench("export_stream_csv_gz")
+def _export_stream_csv_gz(ctx):
+    directory = _audit_segments(ctx)
+    return lambda: sum(len(c) for c in export_logs(directory, "csv.gz"))
+
+
+# ---- Harness ----
+def measure(fn, repeat: int):
+    fn()  # warm-up
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "repeat": repeat,
+        "min_s": min(times),
+        "median_s": statistics.median(times),
+        "mean_s": statistics.fmean(times),
+        "peak_bytes": peak,
+    }
+
+
+def _git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=Path(__file__).parent)
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run_all(ctx, names, repeat: int):
+    results = {}
+    for name in names:
+        fn = BENCHMARKS[name](ctx)
+        if fn is None:
+            continue
+        results[name] = measure(fn, repeat)
+        r = results[name]
+        print(f"{name:24s} median {r['median_s'] * 1e3:10.2f} ms   min {r['min_s'] * 1e3:10.2f} ms   "
+              f"peak {r['peak_bytes'] / 2**20:8.1f} MiB", flush=True)
+    return results
+
+
+def compare(results, baseline, tolerance: float = TOLERANCE):
+    # Returns the names whose median slowed down by more than `tolerance`.
+    regressions = []
+    print(f"\n{'benchmark':24s} {'before':>12s} {'after':>12s} {'change':>8s}")
+    for name, new in results.items():
+        old = baseline.get("results", {}).get(name)
+        if old is None:
+            continue
+        change = new["median_s"] / old["median_s"] - 1 if old["median_s"] else 0.0
+        flag = ""
+        if change > tolerance:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:24s} {old['median_s'] * 1e3:10.2f}ms {new['median_s'] * 1e3:10.2f}ms {change:+8.1%}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Benchmark VitalGuard hot paths")
+    p.add_argument("--patients", type=int, default=100)
+    p.add_argument("--readings", type=int, default=100, help="readings per patient")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--repeat", type=int, default=5)
+    p.add_argument("--only", nargs="*", choices=sorted(BENCHMARKS), help="run just these benchmarks")
+    p.add_argument("--data", help="reuse/keep generated data in this directory")
+    p.add_argument("-o", "--output", help="write results JSON here")
+    p.add_argument("--compare", help="baseline results JSON; exit 1 on regressions")
+    p.add_argument("--tolerance", type=float, default=TOLERANCE)
+    args = p.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="vg-bench-") as tmp:
+        root = Path(args.data or tmp)
+        rows = args.patients * args.readings
+        if not (root / "vitals_store").exists():
+            fmt = "both" if rows <= JSON_MAX_ROWS else "store"
+            t0 = time.perf_counter()
+            generate(root, args.patients, args.readings, args.seed, fmt)
+            print(f"generated {args.patients} patients x {args.readings} readings in {time.perf_counter() - t0:.1f}s")
+        ctx = Context(root, args.patients, args.readings, args.seed)
+        results = run_all(ctx, args.only or list(BENCHMARKS), args.repeat)
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "machine": platform.machine(),
+            "patients": args.patients,
+            "readings": args.readings,
+            "rows": rows,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        if baseline.get("meta", {}).get("rows") != rows:
+            print(f"warning: baseline was run on {baseline.get('meta', {}).get('rows')} rows, this run on {rows}")
+        if compare(results, baseline, args.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+import argparse, json, statistics, subprocess, sys, time
+from pathlib import Path
+
+# Cold-start budget for the headless entry points. Every measurement runs in a
+# fresh interpreter:
+#   - import time of each module (python -X importtime, cumulative us)
+#   - heavy packages that must not be loaded by that import
+#   - wall time from spawning `python -m modules.server --stdio` to its
+#     list_tools reply
+# Exits 1 when a budget is exceeded.
+#
+#   python -m benchmarks.startup [--repeat 5] [-o startup.json]
+
+ROOT = Path(__file__).resolve().parent.parent
+HEAVY = ("numpy", "pandas", "matplotlib", "pyarrow", "streamlit")
+IMPORT_BUDGET_MS = {         # median cumulative import time
+    "modules.metrics": 10,
+    "modules.security": 30,
+    "modules.alerts": 30,
+    "modules.mcp": 75,
+    "modules.server": 100,
+}
+LIST_TOOLS_BUDGET_MS = 100   # median, spawn -> list_tools reply, minus bare interpreter startup
+
+
+def _python(*args, **kwargs):
+    return subprocess.run([sys.executable, *args], cwd=ROOT, capture_output=True, text=True, **kwargs)
+
+
+def import_ms(module: str) -> float:
+    err = _python("-X", "importtime", "-c", f"import {module}").stderr
+    for line in reversed(err.splitlines()):
+        parts = line.split("|")
+        if len(parts) == 3 and parts[2].strip() == module:
+            return int(parts[1]) / 1e3
+    raise RuntimeError(f"could not import {module}:\n{err}")
+
+
+def heavy_loaded(module: str):
+    code = f"import sys, {module}; print(','.join(m for m in {HEAVY!r} if m in sys.modules))"
+    return [m for m in _python("-c", code).stdout.strip().split(",") if m]
+
+
+def interpreter_ms() -> float:
+    t0 = time.perf_counter()
+    _python("-c", "pass")
+    return (time.perf_counter() - t0) * 1e3
+
+
+def list_tools_ms(store_dir: str) -> float:
+    request = json.dumps({"jsonrpc": "2.0", "id": 1, "method": "list_tools"}) + "\n"
+    t0 = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-m", "modules.server", "--stdio", "--store", store_dir],
+                            cwd=ROOT, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    proc.stdin.write(request.encode())
+    proc.stdin.flush()
+    reply = json.loads(proc.stdout.readline())
+    elapsed = (time.perf_counter() - t0) * 1e3
+    proc.stdin.close()
+    proc.wait(timeout=30)
+    if "result" not in reply:
+        raise RuntimeError(f"list_tools failed: {reply}")
+    return elapsed
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Measure cold-start import budgets")
+    p.add_argument("--repeat", type=int, default=5)
+    p.add_argument("--store", default=str(ROOT / "data" / "vitals_store"))
+    p.add_argument("-o", "--output", help="write results JSON here")
+    args = p.parse_args(argv)
+
+    failures, results = [], {"imports": {}, "list_tools": {}}
+    for module, budget in IMPORT_BUDGET_MS.items():
+        ms = statistics.median(import_ms(module) for _ in range(args.repeat))
+        heavy = heavy_loaded(module)
+        results["imports"][module] = {"median_ms": ms, "budget_ms": budget, "heavy": heavy}
+        ok = ms <= budget and not heavy
+        if not ok:
+            failures.append(module)
+        print(f"import {module:20s} {ms:7.1f} ms  (budget {budget} ms)"
+              + (f"  loads {', '.join(heavy)}" if heavy else "") + ("" if ok else "  OVER"))
+
+    base = statistics.median(interpreter_ms() for _ in range(args.repeat))
+    total = statistics.median(list_tools_ms(args.store) for _ in range(args.repeat))
+    ms = total - base
+    results["list_tools"] = {"median_ms": total, "interpreter_ms": base, "net_ms": ms, "budget_ms": LIST_TOOLS_BUDGET_MS}
+    ok = ms <= LIST_TOOLS_BUDGET_MS
+    if not ok:
+        failures.append("list_tools")
+    print(f"list_tools cold start   {total:7.1f} ms  (interpreter {base:.1f} ms, net {ms:.1f} ms, "
+          f"budget {LIST_TOOLS_BUDGET_MS} ms)" + ("" if ok else "  OVER"))
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,172 @@
+import atexit, json, os, queue, threading, time
+from collections import defaultdict, deque
+from dataclasses import dataclass, asdict, field
+from pathlib import Path
+from typing import Optional
+
+# Alert dispatch: submit() is non-blocking and deduplicates per (patient, kind)
+# inside a time window; a worker thread batches queued alerts per doctor,
+# applies a per-doctor rate limit (excess alerts wait, they are not dropped)
+# and hands each batch to a pluggable sink. Waiting alerts are bounded: once
+# the per-doctor backlogs hold queue_size alerts, new ones stay in the queue
+# and submit() reports queue_full when that fills too.
+
+DEDUP_WINDOW = 15 * 60        # seconds a repeated (patient, kind) alert is suppressed
+RATE_LIMIT = 20               # alerts per doctor ...
+RATE_PERIOD = 60.0            # ... per this many seconds
+BATCH_INTERVAL = 1.0          # seconds between dispatch cycles
+QUEUE_SIZE = 10_000
+DEFAULT_DOCTOR = "on-call"
+
+QUEUED, DUPLICATE, FULL = "queued", "duplicate", "queue_full"
+
+
+@dataclass
+class Alert:
+    patient_id: str
+    message: str
+    kind: str = "threshold"
+    doctor: str = DEFAULT_DOCTOR
+    trace_id: Optional[str] = None
+    ts: float = field(default_factory=time.time)
+
+
+# ---- Sinks ----
+class LoopbackSink:
+    # Keeps delivered batches in memory (tests, demos).
+    def __init__(self):
+        self.batches = []
+        self._lock = threading.Lock()
+
+    def deliver(self, doctor: str, alerts):
+        with self._lock:
+            self.batches.append((doctor, list(alerts)))
+
+    @property
+    def alerts(self):
+        with self._lock:
+            return [a for _, batch in self.batches for a in batch]
+
+
+class FileSink:
+    # Appends one JSON line per delivered batch; a local stand-in for a pager/e-mail gateway.
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def deliver(self, doctor: str, alerts):
+        line = json.dumps({"doctor": doctor, "sent_at": time.time(), "alerts": [asdict(a) for a in alerts]})
+        with open(self.path, "a") as f:
+            f.write(line + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+
+# ---- Dispatcher ----
+class _TokenBucket:
+    def __init__(self, rate: float, period: float):
+        self.capacity = rate
+        self.tokens = rate
+        self.refill = rate / period
+        self.stamp = time.monotonic()
+
+    def take(self, n: int) -> int:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.refill)
+        self.stamp = now
+        granted = min(n, int(self.tokens))
+        self.tokens -= granted
+        return granted
+
+
+class AlertDispatcher:
+    def __init__(self, sink, dedup_window: float = DEDUP_WINDOW, rate: int = RATE_LIMIT,
+                 period: float = RATE_PERIOD, batch_interval: float = BATCH_INTERVAL, queue_size: int = QUEUE_SIZE):
+        self.sink = sink
+        self.dedup_window = dedup_window
+        self.rate, self.period = rate, period
+        self.batch_interval = batch_interval
+        self._queue = queue.Queue(maxsize=queue_size)
+        self.backlog_size = queue_size           # alerts held across all per-doctor backlogs
+        self._last = {}                          # (patient_id, kind) -> ts of last accepted alert
+        self._lock = threading.Lock()
+        self._backlog = defaultdict(deque)       # doctor -> alerts waiting for rate-limit tokens
+        self._backlogged = 0
+        self._buckets = {}
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self.stats = {"submitted": 0, "queued": 0, "duplicates": 0, "dropped": 0, "delivered": 0, "batches": 0}
+        self._thread = threading.Thread(target=self._run, name="alert-dispatch", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)  # deliver what is queued (rate permitting) on shutdown
+
+    def submit(self, patient_id: str, message: str, kind: str = "threshold", doctor: str = DEFAULT_DOCTOR,
+               trace_id: str = None, dedup: bool = True) -> str:
+        now = time.time()
+        key = (patient_id, kind)
+        with self._lock:
+            self.stats["submitted"] += 1
+            if dedup:
+                last = self._last.get(key)
+                if last is not None and now - last < self.dedup_window:
+                    self.stats["duplicates"] += 1
+                    return DUPLICATE
+            try:
+                self._queue.put_nowait(Alert(patient_id, message, kind, doctor, trace_id, now))
+            except queue.Full:
+                self.stats["dropped"] += 1
+                return FULL
+            self._last[key] = now
+            self.stats["queued"] += 1
+        return QUEUED
+
+    def clear(self, patient_id: str, kind: str = "threshold"):
+        # Call when the condition resolves so a recurrence alerts again immediately.
+        with self._lock:
+            self._last.pop((patient_id, kind), None)
+
+    def _dispatch(self):
+        while self._backlogged < self.backlog_size:
+            try:
+                alert = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            self._backlog[alert.doctor].append(alert)
+            self._backlogged += 1
+        for doctor, pending in list(self._backlog.items()):
+            bucket = self._buckets.get(doctor)
+            if bucket is None:
+                bucket = self._buckets[doctor] = _TokenBucket(self.rate, self.period)
+            n = bucket.take(len(pending))
+            if n == 0:
+                continue
+            batch = [pending.popleft() for _ in range(n)]
+            try:
+                self.sink.deliver(doctor, batch)
+            except Exception:
+                pending.extendleft(reversed(batch))  # retry next cycle
+                continue
+            self._backlogged -= n
+            self.stats["delivered"] += n
+            self.stats["batches"] += 1
+            if not pending:
+                del self._backlog[doctor]
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.batch_interval)
+            self._wake.clear()
+            self._dispatch()
+        self._dispatch()
+
+    def flush(self):
+        # Dispatch now (still subject to rate limits).
+        self._wake.set()
+
+    def pending(self) -> int:
+        return self._queue.qsize() + self._backlogged
+
+    def close(self):
+        self._stop.set()
+        self._wake.set()
+        self._thread.join()
@@ -1,27 +1,309 @@
-import pandas as pd, time, uuid, io
+import pandas as pd, numpy as np, time, io, csv, os, re, secrets, threading, weakref, atexit, zlib
+from pathlib import Path
+
+COLUMNS = ["ts", "trace_id", "action", "subject", "status", "scopes"]
+DEFAULT_CAPACITY = 10_000     # events kept in memory per log
+FLUSH_INTERVAL = 1.0          # seconds between background flushes
+FLUSH_BATCH = 512             # pending events that trigger an early flush
+
+EXPORT_CHUNK_ROWS = 5_000     # rows per encoded export chunk
+EXPORT_FORMATS = {"csv": "text/csv", "csv.gz": "application/gzip", "parquet": "application/vnd.apache.parquet"}
+
+_TRACE_MUL = 0x9E3779B1       # odd constant: n -> n * MUL mod 2**32 is a bijection
+_TRACE_HEX = re.compile(r"[0-9a-f]{8}")  # trace ids this log generates; stored as their value
+
 
 class AuditLog:
-    def __init__(self):
-        self._events = []
-
-    def add(self, action: str, subject: str, status: str, scopes):
-        self._events.append({
-            "ts": int(time.time()),
-            "trace_id": str(uuid.uuid4())[:8],
-            "action": action,
-            "subject": subject,
-            "status": status,
-            "scopes": ",".join(scopes or [])
+    # Fixed-size ring of the most recent events, stored column-wise as numpy
+    # arrays (strings are interned to int codes). With `path` set, events are
+    # also appended in batches to daily CSV segments by a background flusher.
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, path=None):
+        self.capacity = capacity
+        self.path = Path(path) if path is not None else None
+        self._ts = np.zeros(capacity, dtype=np.float64)
+        self._trace = np.zeros(capacity, dtype=np.int64)  # 8-hex id value, or -1 - string code
+        self._codes = np.zeros((capacity, 4), dtype=np.int32)  # action, subject, status, scopes
+        self._strings = []
+        self._string_codes = {}
+        self._count = 0
+        self._trace_seed = secrets.randbits(32)
+        self._pending = []
+        self._lock = threading.Lock()
+        self._view = None
+        self._view_key = None
+        if self.path is not None:
+            self.path.mkdir(parents=True, exist_ok=True)
+            _flusher.register(self)
+            # a log dropped with its session still gets its last events written
+            weakref.finalize(self, _write_pending, self.path, self._pending)
+
+    def _intern(self, s: str) -> int:
+        code = self._string_codes.get(s)
+        if code is None:
+            code = self._string_codes[s] = len(self._strings)
+            self._strings.append(s)
+        return code
+
+    def add(self, action: str, subject: str, status: str, scopes, trace_id: str = None) -> str:
+        ts = time.time()
+        scopes = scopes if isinstance(scopes, str) else ",".join(scopes or [])
+        with self._lock:
+            n = self._count
+            if not trace_id:
+                trace_id = f"{((self._trace_seed + n) * _TRACE_MUL) & 0xFFFFFFFF:08x}"
+            # any other id (non-hex, longer) is interned like the other strings
+            trace = int(trace_id, 16) if _TRACE_HEX.fullmatch(trace_id) else -1 - self._intern(trace_id)
+            i = n % self.capacity
+            self._ts[i] = ts
+            self._trace[i] = trace
+            self._codes[i] = (self._intern(action), self._intern(str(subject)), self._intern(status), self._intern(scopes))
+            self._count = n + 1
+            if self.path is not None:
+                self._pending.append((ts, trace_id, action, str(subject), status, scopes))
+                if len(self._pending) >= FLUSH_BATCH:
+                    _flusher.wake()
+        return trace_id
+
+    def __len__(self):
+        return min(self._count, self.capacity)
+
+    def as_dataframe(self, limit: int = None):
+        # Newest `limit` events (all buffered ones by default), oldest first.
+        # Cost is O(rows returned); an unchanged log returns the cached view.
+        with self._lock:
+            count = self._count
+            n = min(count, self.capacity if limit is None else min(limit, self.capacity))
+            if n == 0:
+                return None
+            if self._view_key == (count, n):
+                return self._view
+            idx = np.arange(count - n, count) % self.capacity
+            ts, trace, codes = self._ts[idx], self._trace[idx], self._codes[idx]
+            strings = np.array(self._strings, dtype=object)
+
+        df = pd.DataFrame({
+            "ts": pd.to_datetime(ts, unit="s"),
+            "trace_id": [f"{t:08x}" if t >= 0 else strings[-1 - t] for t in trace.tolist()],
+            "action": strings[codes[:, 0]],
+            "subject": strings[codes[:, 1]],
+            "status": strings[codes[:, 2]],
+            "scopes": strings[codes[:, 3]],
         })
+        with self._lock:
+            if self._count == count:
+                self._view, self._view_key = df, (count, n)
+        return df
+
+    # ---- Persistence ----
+    def flush(self):
+        with self._lock:
+            batch = self._pending[:]
+            self._pending.clear()
+        if not batch:
+            return
+        try:
+            write_segments(self.path, batch)
+        except OSError:
+            with self._lock:
+                self._pending[:0] = batch  # retried on the next flush
+            raise
+
+    def close(self):
+        self.flush()
+        _flusher.unregister(self)
+
+
+def segment_path(directory: Path, ts: float) -> Path:
+    return Path(directory) / time.strftime("audit-%Y-%m-%d.csv", time.gmtime(ts))
+
+
+_segment_lock = threading.Lock()
+
+
+def write_segments(directory: Path, rows):
+    # Append rows to their daily segments; one write per segment per batch.
+    by_file = {}
+    for row in rows:
+        by_file.setdefault(segment_path(directory, row[0]), []).append(row)
+    with _segment_lock:
+        for path, chunk in by_file.items():
+            buf = io.StringIO()
+            w = csv.writer(buf)
+            if not path.exists():
+                w.writerow(COLUMNS)
+            w.writerows((f"{r[0]:.3f}",) + tuple(r[1:]) for r in chunk)
+            with open(path, "a", newline="") as f:
+                f.write(buf.getvalue())
+                f.flush()
+                os.fsync(f.fileno())
+
+
+def _write_pending(directory, pending):
+    if pending:
+        write_segments(directory, pending)
+        pending.clear()
+
+
+class _Flusher:
+    # One daemon thread flushes every persistent AuditLog in the process.
+    def __init__(self):
+        self._logs = weakref.WeakSet()
+        self._lock = threading.Lock()
+        self._event = threading.Event()
+        self._thread = None
+
+    def register(self, log):
+        with self._lock:
+            self._logs.add(log)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="audit-flusher", daemon=True)
+                self._thread.start()
+
+    def unregister(self, log):
+        with self._lock:
+            self._logs.discard(log)
+
+    def wake(self):
+        self._event.set()
+
+    def flush_all(self):
+        with self._lock:
+            logs = list(self._logs)
+        for log in logs:
+            log.flush()
+
+    def _run(self):
+        while True:
+            self._event.wait(FLUSH_INTERVAL)
+            self._event.clear()
+            try:
+                self.flush_all()
+            except OSError:
+                pass  # events stay pending; the next cycle retries
+
+
+_flusher = _Flusher()
+atexit.register(_flusher.flush_all)
 
-    def as_dataframe(self):
-        if not self._events:
-            return None
-        df = pd.DataFrame(self._events)
-        df["ts"] = pd.to_datetime(df["ts"], unit="s")
-        return df[["ts","trace_id","action","subject","status","scopes"]]
 
 def export_logs_csv(df: pd.DataFrame) -> bytes:
     buf = io.StringIO()
     df.to_csv(buf, index=False)
     return buf.getvalue().encode("utf-8")
+
+
+# ---- Streaming export from the persisted segments ----
+def _epoch(value):
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    return pd.Timestamp(value).timestamp()
+
+
+def iter_audit_rows(directory, start=None, end=None, subjects=None, chunk_rows: int = EXPORT_CHUNK_ROWS):
+    # Yields lists of rows (ts as float, other fields as str). Filters are
+    # applied while reading: whole daily segments outside [start, end] are
+    # skipped by name, then rows are checked before they are kept.
+    lo, hi = _epoch(start), _epoch(end)
+    lo_day = time.strftime("%Y-%m-%d", time.gmtime(lo)) if lo is not None else None
+    hi_day = time.strftime("%Y-%m-%d", time.gmtime(hi)) if hi is not None else None
+    subjects = set(subjects) if subjects else None
+    chunk = []
+    for path in sorted(Path(directory).glob("audit-*.csv")):
+        day = path.stem[len("audit-"):]
+        if (lo_day and day < lo_day) or (hi_day and day > hi_day):
+            continue
+        with open(path, "r", newline="") as f:
+            reader = csv.reader(f)
+            next(reader, None)  # header
+            for row in reader:
+                if len(row) != len(COLUMNS):
+                    continue  # torn line from a crash mid-write
+                if subjects is not None and row[3] not in subjects:
+                    continue
+                ts = float(row[0])
+                if (lo is not None and ts < lo) or (hi is not None and ts > hi):
+                    continue
+                row[0] = ts
+                chunk.append(row)
+                if len(chunk) >= chunk_rows:
+                    yield chunk
+                    chunk = []
+    if chunk:
+        yield chunk
+
+
+def _csv_chunks(row_chunks):
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    w.writerow(COLUMNS)
+    yield buf.getvalue().encode("utf-8")
+    for rows in row_chunks:
+        buf.seek(0)
+        buf.truncate()
+        w.writerows([time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(r[0]))] + r[1:] for r in rows)
+        yield buf.getvalue().encode("utf-8")
+
+
+def _gzip_chunks(chunks):
+    z = zlib.compressobj(wbits=31)  # gzip container
+    for chunk in chunks:
+        out = z.compress(chunk)
+        if out:
+            yield out
+    yield z.flush()
+
+
+class _ChunkSink(io.RawIOBase):
+    # Write-only file object that hands back whatever was written since the last drain.
+    def __init__(self):
+        self._parts = []
+        self._pos = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._parts.append(bytes(b))
+        self._pos += len(b)
+        return len(b)
+
+    def tell(self):
+        return self._pos
+
+    def drain(self) -> bytes:
+        out = b"".join(self._parts)
+        self._parts = []
+        return out
+
+
+def _parquet_chunks(row_chunks):
+    try:
+        import pyarrow as pa, pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+    schema = pa.schema([("ts", pa.timestamp("ms")), ("trace_id", pa.string()), ("action", pa.string()),
+                        ("subject", pa.string()), ("status", pa.string()), ("scopes", pa.string())])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="snappy")
+    for rows in row_chunks:
+        cols = list(zip(*rows))
+        ts = (np.asarray(cols[0], dtype=np.float64) * 1000).astype("int64")
+        writer.write_table(pa.Table.from_arrays([pa.array(ts, pa.timestamp("ms"))] + [pa.array(c, pa.string()) for c in cols[1:]], schema=schema))
+        yield sink.drain()  # one row group per chunk
+    writer.close()
+    yield sink.drain()
+
+
+def export_logs(directory, fmt: str = "csv", start=None, end=None, subjects=None, chunk_rows: int = EXPORT_CHUNK_ROWS):
+    # Stream the persisted audit log as encoded chunks in `fmt` (see EXPORT_FORMATS).
+    rows = iter_audit_rows(directory, start, end, subjects, chunk_rows)
+    if fmt == "csv":
+        return _csv_chunks(rows)
+    if fmt == "csv.gz":
+        return _gzip_chunks(_csv_chunks(rows))
+    if fmt == "parquet":
+        return _parquet_chunks(rows)
+    raise ValueError(f"Unknown export format: {fmt}")
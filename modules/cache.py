@@ -0,0 +1,236 @@
+import threading
+from collections import OrderedDict
+from pathlib import Path
+import numpy as np, pandas as pd
+from modules.store import VitalsStore
+from modules.repository import VitalsRepository, latest_frame, latest_row
+from modules.windows import WindowEngine
+from modules.metrics import span
+
+# Process-wide vitals cache. Streamlit imports modules once per server process,
+# so every session (and the MCP server) shares one parse of the store.
+#
+# The dashboard and MCP paths never hold the whole ward in memory:
+#   - latest readings (and the ward status built from them) come from a small
+#     per-patient latest-row cache, filled from the tail of the store;
+#   - trend windows and charts read only their window's rows (store.tail);
+#   - full histories are loaded on demand into an LRU of per-patient frames,
+#     bounded by max_bytes, with cold patients evicted.
+# Everything is keyed by patient_stamp, so a data version bump only re-reads
+# the patients whose files changed. repository() is the whole-ward copy for
+# full scans (the chatbot's query index, shard exports); it is built only when
+# asked for and reported separately in stats().
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def _nbytes(frame):
+    return int(frame.memory_usage(index=False, deep=False).sum())
+
+
+class VitalsCache:
+    def __init__(self, store: VitalsStore, max_bytes: int = DEFAULT_MAX_BYTES, owns=None):
+        self.store = store
+        self.max_bytes = max_bytes
+        self.owns = owns  # optional patient_id -> bool filter (e.g. one shard's patients)
+        self._lock = threading.RLock()
+        self._partitions = OrderedDict()  # patient_id -> (stamp, frame, nbytes), LRU order
+        self._bytes = 0
+        self._scan = self._scan_version = None   # patient_id -> stamp, per data version
+        self._latest = {}                        # patient_id -> (stamp, latest row)
+        self._ward = self._ward_version = None
+        self._repo = self._repo_version = None
+        self._repo_stamps, self._repo_sizes = {}, {}
+        self._windows = WindowEngine()
+        self._window_stamps = {}                 # patient_id -> stamp the windows are synced to
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "repo_hits": 0, "repo_builds": 0}
+
+    def _stamps(self):
+        # (version, {patient_id: patient_stamp}) of every owned patient; one stat
+        # pass per data version, shared by all the lookups below.
+        version = self.store.version()
+        with self._lock:
+            if self._scan_version == version:
+                return version, self._scan
+        pids = self.store.patient_ids()
+        if self.owns is not None:
+            pids = [pid for pid in pids if self.owns(pid)]
+        scan = {pid: self.store.patient_stamp(pid) for pid in pids}
+        with self._lock:
+            self._scan, self._scan_version = scan, version
+        return version, scan
+
+    def _hot(self, patient_id, stamp):
+        # The cached full history of patient_id, if it is current.
+        with self._lock:
+            entry = self._partitions.get(patient_id)
+            return entry[1] if entry is not None and entry[0] == stamp else None
+
+    def patient(self, patient_id) -> pd.DataFrame:
+        # One patient's history; re-read only when its files changed.
+        stamp = self.store.patient_stamp(patient_id)
+        with self._lock:
+            entry = self._partitions.get(patient_id)
+            if entry is not None and entry[0] == stamp:
+                self._partitions.move_to_end(patient_id)
+                self._stats["hits"] += 1
+                return entry[1]
+            self._stats["misses"] += 1
+
+        frame = self.store.read(patient_id)
+        nbytes = _nbytes(frame)
+        with self._lock:
+            old = self._partitions.pop(patient_id, None)
+            if old is not None:
+                self._bytes -= old[2]
+            self._partitions[patient_id] = (stamp, frame, nbytes)
+            self._bytes += nbytes
+            self._evict()
+        return frame
+
+    def _evict(self):
+        # Drop cold partitions until under budget; the most recent one always stays.
+        while self._bytes > self.max_bytes and len(self._partitions) > 1:
+            _, (_, _, nbytes) = self._partitions.popitem(last=False)
+            self._bytes -= nbytes
+            self._stats["evictions"] += 1
+
+    def repository(self) -> VitalsRepository:
+        # Whole-ward repository for full scans, rebuilt per data version; patients
+        # whose stamp did not change keep their frames from the previous build.
+        version, scan = self._stamps()
+        with self._lock:
+            if self._repo is not None and self._repo_version == version:
+                self._stats["repo_hits"] += 1
+                return self._repo
+            previous, known, sizes = self._repo, self._repo_stamps, self._repo_sizes
+        with span("vitals_load"):
+            frames, new_sizes = {}, {}
+            for pid, stamp in scan.items():
+                if previous is not None and known.get(pid) == stamp:
+                    frames[pid], new_sizes[pid] = previous.history(pid), sizes.get(pid, 0)
+                else:
+                    frames[pid] = self.patient(pid)
+                    new_sizes[pid] = _nbytes(frames[pid])
+            repo = VitalsRepository(frames, version, previous)
+        with self._lock:
+            self._repo, self._repo_version = repo, version
+            self._repo_stamps, self._repo_sizes = scan, new_sizes
+            self._stats["repo_builds"] += 1
+        return repo
+
+    def stamps(self):
+        # patient_id -> patient_stamp the frames of repository() were read at
+        self.repository()
+        with self._lock:
+            return dict(self._repo_stamps)
+
+    def windows(self) -> WindowEngine:
+        # Rolling-window engine, caught up with only the patients whose files
+        # changed since the last call, each from the rows its windows still need.
+        _, scan = self._stamps()
+        with self._lock:
+            for pid, stamp in scan.items():
+                if self._window_stamps.get(pid) == stamp:
+                    continue
+                start = self._windows.resume_from(pid)
+                frame = self.store.tail(pid, self._windows.horizon) if start is None else self.store.read(pid, start)
+                self._windows.sync(pid, frame)
+                self._window_stamps[pid] = stamp
+        return self._windows
+
+    def ingested(self, batches):
+        # Append path: feed batches just written to the store ({patient_id: columns})
+        # straight into the rolling windows. Rows the windows already hold are
+        # recognised by count at the next sync and not replayed.
+        for pid, columns in batches.items():
+            if self.owns is None or self.owns(pid):
+                self._windows.extend(pid, columns)
+
+    # ---- Vitals source (same surface as modules.shards.ShardPool) ----
+    def version(self):
+        return self.store.version()
+
+    def patient_ids(self):
+        return list(self._stamps()[1])
+
+    def latest(self, patient_id):
+        # Newest reading as a dict (plus "bp"), re-read only when the patient changed.
+        stamp = self._stamps()[1].get(patient_id)
+        if stamp is None:
+            return None
+        with self._lock:
+            entry = self._latest.get(patient_id)
+            if entry is not None and entry[0] == stamp:
+                return entry[1]
+        frame = self._hot(patient_id, stamp)
+        if frame is None:
+            frame = self.store.tail(patient_id)
+        row = latest_row(frame) if len(frame) else None
+        with self._lock:
+            self._latest[patient_id] = (stamp, row)
+        return row
+
+    def latest_many(self, patient_ids):
+        return {pid: self.latest(pid) for pid in patient_ids}
+
+    def history(self, patient_id):
+        return self.patient(patient_id)
+
+    def recent(self, patient_id, seconds: float):
+        # The patient's newest `seconds` of readings: sliced from its cached history
+        # when that is current, otherwise read from the tail of the store.
+        stamp = self._stamps()[1].get(patient_id)
+        frame = self._hot(patient_id, stamp) if stamp is not None else None
+        if frame is None:
+            return self.store.tail(patient_id, seconds)
+        if frame.empty:
+            return frame
+        ts = frame["timestamp"].to_numpy("datetime64[ns]")
+        return frame.iloc[int(np.searchsorted(ts, ts[-1] - np.timedelta64(int(seconds * 1e9), "ns"), side="left")):]
+
+    def trend(self, patient_id, window: str = None):
+        return self.windows().trend(patient_id, window)
+
+    def ward_status(self):
+        # Latest reading and threshold levels of every patient, built once per data version.
+        from modules import thresholds
+        version, scan = self._stamps()
+        with self._lock:
+            if self._ward_version == version:
+                return self._ward
+        rows = [row for row in (self.latest(pid) for pid in scan) if row is not None]
+        ward = thresholds.ward_status(latest_frame(rows))
+        with self._lock:
+            self._ward, self._ward_version = ward, version
+        return ward
+
+    def invalidate(self):
+        with self._lock:
+            self._partitions.clear()
+            self._bytes = 0
+            self._scan = self._scan_version = None
+            self._latest.clear()
+            self._ward = self._ward_version = None
+            self._repo = self._repo_version = None
+            self._repo_stamps, self._repo_sizes = {}, {}
+            self._window_stamps.clear()
+
+    def stats(self):
+        # bytes/max_bytes: the history LRU. repo_*: the full-scan repository, if built.
+        with self._lock:
+            return dict(self._stats, partitions=len(self._partitions), bytes=self._bytes, max_bytes=self.max_bytes,
+                        latest=len(self._latest), repo_patients=len(self._repo) if self._repo is not None else 0,
+                        repo_bytes=sum(self._repo_sizes.values()))
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(store_dir, max_bytes: int = DEFAULT_MAX_BYTES) -> VitalsCache:
+    key = str(Path(store_dir).resolve())
+    with _caches_lock:
+        if key not in _caches:
+            _caches[key] = VitalsCache(VitalsStore(store_dir), max_bytes=max_bytes)
+        return _caches[key]
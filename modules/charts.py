@@ -0,0 +1,88 @@
+import io, threading
+from collections import OrderedDict
+import numpy as np
+from modules.metrics import span
+
+# Trend charts without pyplot: every render builds its own Figure/canvas, so
+# concurrent sessions never share matplotlib state (imported on the first render,
+# so cache hits and headless callers never load it). Series are downsampled to
+# about one point per horizontal pixel and PNGs are cached per
+# (patient, window, data version, size).
+
+WIDTH_PX, HEIGHT_PX, DPI = 800, 360, 100
+CACHE_ENTRIES = 256
+
+SERIES = [("heart_rate", "Heart Rate"), ("spo2", "SpO2"), ("temp", "Temp (°C)")]
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int):
+    # Largest-Triangle-Three-Buckets: keeps the visual shape (peaks, dips) of a
+    # series while reducing it to n_out points. Returns the selected indices.
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = x.astype(np.float64)
+    y = y.astype(np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)  # n_out - 2 inner buckets
+    out = np.empty(n_out, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nlo, nhi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        cx, cy = x[nlo:nhi].mean(), y[nlo:nhi].mean()  # average of the next bucket
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(np.argmax(area))
+        out[i + 1] = a
+    return out
+
+
+def render_trend(frame, width_px: int = WIDTH_PX, height_px: int = HEIGHT_PX, dpi: int = DPI) -> bytes:
+    # frame: one patient's rows with a datetime "timestamp" column. Returns PNG bytes.
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    fig = Figure(figsize=(width_px / dpi, height_px / dpi), dpi=dpi)
+    canvas = FigureCanvasAgg(fig)
+    ax = fig.add_subplot(111)
+    ts = frame["timestamp"].to_numpy("datetime64[ns]")
+    x = ts.astype(np.int64)
+    for col, label in SERIES:
+        y = frame[col].to_numpy(dtype=np.float64)
+        keep = lttb(x, y, width_px)
+        ax.plot(ts[keep], y[keep], label=label)
+    ax.legend()
+    ax.set_xlabel("Time")
+    ax.set_ylabel("Value")
+    fig.autofmt_xdate()
+    buf = io.BytesIO()
+    canvas.print_png(buf)
+    return buf.getvalue()
+
+
+class ChartCache:
+    def __init__(self, max_entries: int = CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def trend_png(self, key, frame, width_px: int = WIDTH_PX, height_px: int = HEIGHT_PX) -> bytes:
+        # key: (patient_id, window, data version frame was read at); frame is only drawn on a miss.
+        key = key + (width_px, height_px)
+        with self._lock:
+            png = self._items.get(key)
+            if png is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return png
+            self.misses += 1
+        with span("chart_render"):
+            png = render_trend(frame, width_px, height_px)
+        with self._lock:
+            self._items[key] = png
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+        return png
+
+
+chart_cache = ChartCache()
@@ -1,6 +1,12 @@
 import json, pandas as pd
+from pathlib import Path
+from modules.store import VitalsStore
 
 def load_vitals(path):
+    # A directory is a columnar store (see modules.store); it exposes the same
+    # keys()/get() surface as the legacy JSON dict.
+    if Path(path).is_dir():
+        return VitalsStore(path)
     with open(path, "r") as f:
         return json.load(f)
 
@@ -12,6 +18,6 @@ def get_patient(data, patient_id):
 
 def vitals_dataframe(patient):
     hist = patient
-    if not hist:
+    if hist is None or len(hist) == 0:
         return None
     return pd.DataFrame(hist)
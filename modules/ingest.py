@@ -0,0 +1,262 @@
+import argparse, json, queue, random, threading, time
+from collections import defaultdict
+import numpy as np
+from modules.cache import get_cache
+from modules.store import VitalsStore, FIELDS
+from modules.readings import Reading, valid_patient_id
+
+# Streaming ingestion: devices publish readings on "vitals/<patient_id>", the
+# pipeline validates/normalizes them and appends batches to the vitals store.
+# LocalBroker is an in-process, MQTT-style stand-in so the whole path can be
+# run and load-tested offline:
+#
+#   python -m modules.ingest --patients 200 --rate 5000 --seconds 10
+
+TOPIC = "vitals/+"
+BATCH_SIZE = 1000             # readings per store write
+FLUSH_INTERVAL = 0.25         # max seconds a reading waits in the batch
+QUEUE_SIZE = 10_000           # per-subscriber buffer; publishers block when full
+
+
+# ---- Broker ----
+def topic_matches(pattern: str, topic: str) -> bool:
+    # MQTT wildcards: "+" matches one level, a trailing "#" matches the rest.
+    p_parts, t_parts = pattern.split("/"), topic.split("/")
+    for i, p in enumerate(p_parts):
+        if p == "#":
+            return True
+        if i >= len(t_parts) or (p != "+" and p != t_parts[i]):
+            return False
+    return len(p_parts) == len(t_parts)
+
+
+class Subscription:
+    def __init__(self, pattern: str, maxsize: int):
+        self.pattern = pattern
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def get(self, timeout=None):
+        return self.queue.get(timeout=timeout)
+
+
+class LocalBroker:
+    def __init__(self):
+        self._subs = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, pattern: str, maxsize: int = QUEUE_SIZE) -> Subscription:
+        sub = Subscription(pattern, maxsize)
+        with self._lock:
+            self._subs.append(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        with self._lock:
+            self._subs.remove(sub)
+
+    def publish(self, topic: str, payload, timeout=None) -> int:
+        # Blocks while a subscriber's queue is full (backpressure). With a
+        # timeout, a message that still does not fit is dropped for that subscriber.
+        with self._lock:
+            subs = [s for s in self._subs if topic_matches(s.pattern, topic)]
+        for sub in subs:
+            try:
+                sub.queue.put((topic, payload), timeout=timeout)
+            except queue.Full:
+                sub.dropped += 1
+        return len(subs)
+
+
+# ---- Validation ----
+def normalize(topic: str, payload):
+    # Returns the patient id and a row tuple in FIELDS order, or None if invalid.
+    # The patient id falls back to the topic's last level; either must be a
+    # plain id (readings.PATIENT_ID), since it becomes a store directory.
+    try:
+        if isinstance(payload, (bytes, str)):
+            reading = Reading.model_validate_json(payload)
+        elif isinstance(payload, dict):
+            reading = Reading.model_validate(payload)
+        else:
+            return None
+    except ValueError:  # includes pydantic.ValidationError
+        return None
+    patient_id = reading.patient_id or topic.rsplit("/", 1)[-1]
+    if not valid_patient_id(patient_id):
+        return None
+    return patient_id, reading.row()
+
+
+# ---- Pipeline ----
+class IngestionPipeline:
+    def __init__(self, broker: LocalBroker, store: VitalsStore, topic: str = TOPIC,
+                 batch_size: int = BATCH_SIZE, flush_interval: float = FLUSH_INTERVAL, queue_size: int = QUEUE_SIZE,
+                 cache=None):
+        self.store = store.init()
+        self.cache = cache  # optional VitalsCache of this store; its rolling windows are fed per batch
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._broker = broker
+        self._sub = broker.subscribe(topic, maxsize=queue_size)
+        self._stop = threading.Event()
+        self._thread = None
+        self.stats = {"received": 0, "accepted": 0, "rejected": 0, "written": 0, "batches": 0,
+                      "errors": 0, "lost": 0}   # errors: failed messages/batches; lost: rows of failed batches
+        self.last_error = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="vitals-ingest", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        # Drains what is already queued, writes the last batch, then returns.
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._broker.unsubscribe(self._sub)
+
+    def _run(self):
+        pending = defaultdict(list)
+        n_pending = 0
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            timeout = max(0.0, deadline - time.monotonic())
+            try:
+                topic, payload = self._sub.get(timeout=timeout)
+            except queue.Empty:
+                topic = None
+            if topic is not None:
+                self.stats["received"] += 1
+                try:
+                    norm = normalize(topic, payload)
+                except Exception as e:  # one bad message must not stop ingestion
+                    norm = None
+                    self._error(e)
+                if norm is None:
+                    self.stats["rejected"] += 1
+                else:
+                    pending[norm[0]].append(norm[1])
+                    n_pending += 1
+                    self.stats["accepted"] += 1
+            if n_pending >= self.batch_size or time.monotonic() >= deadline:
+                if n_pending:
+                    self._write(pending)
+                    pending, n_pending = defaultdict(list), 0
+                deadline = time.monotonic() + self.flush_interval
+            if topic is None and self._stop.is_set() and self._sub.queue.empty():
+                if n_pending:
+                    self._write(pending)
+                return
+
+    def _error(self, e):
+        self.stats["errors"] += 1
+        self.last_error = f"{type(e).__name__}: {e}"
+
+    def _write(self, pending):
+        # A failed batch is counted and dropped; the loop keeps draining the
+        # queue so publishers never block on a dead consumer.
+        try:
+            self._write_batch(pending)
+        except Exception as e:
+            self.stats["lost"] += sum(len(rows) for rows in pending.values())
+            self._error(e)
+
+    def _write_batch(self, pending):
+        batches = {}
+        for patient_id, rows in pending.items():
+            cols = {f: np.array(values, dtype=t) for (f, t), values in zip(FIELDS.items(), zip(*rows))}
+            order = np.argsort(cols["timestamp"], kind="stable")
+            batches[patient_id] = {f: v[order] for f, v in cols.items()}
+        self.stats["written"] += self.store.append_many(batches)
+        self.stats["batches"] += 1
+        if self.cache is not None:
+            self.cache.ingested(batches)
+
+
+# ---- Simulator ----
+class DeviceSimulator:
+    # Publishes random-walk readings for `patient_ids` at roughly `rate` msgs/sec in total.
+    def __init__(self, broker: LocalBroker, patient_ids, rate: float = 1000.0, seed=None):
+        self.broker = broker
+        self.patient_ids = list(patient_ids)
+        self.rate = rate
+        self._rng = random.Random(seed)
+        self._stop = threading.Event()
+        self._thread = None
+        self.sent = 0
+        self._state = {
+            pid: {"heart_rate": 80.0, "spo2": 97.0, "sys": 120.0, "dia": 80.0, "temp": 36.8}
+            for pid in self.patient_ids
+        }
+
+    def _reading(self, pid):
+        s, r = self._state[pid], self._rng
+        s["heart_rate"] = min(180, max(40, s["heart_rate"] + r.gauss(0, 2)))
+        s["spo2"] = min(100, max(80, s["spo2"] + r.gauss(0, 0.5)))
+        s["sys"] = min(200, max(90, s["sys"] + r.gauss(0, 1.5)))
+        s["dia"] = min(s["sys"] - 20, max(50, s["dia"] + r.gauss(0, 1)))
+        s["temp"] = min(41, max(35, s["temp"] + r.gauss(0, 0.05)))
+        return json.dumps({
+            "timestamp": time.time(),
+            "heart_rate": round(s["heart_rate"]),
+            "spo2": round(s["spo2"]),
+            "bp": f"{round(s['sys'])}/{round(s['dia'])}",
+            "temp": round(s["temp"], 1),
+        })
+
+    def run(self, seconds: float):
+        # Publishes in small bursts so the overall rate stays close to `rate`.
+        start = time.monotonic()
+        burst = max(1, int(self.rate / 100))
+        i = 0
+        while not self._stop.is_set():
+            elapsed = time.monotonic() - start
+            if elapsed >= seconds:
+                break
+            due = int(elapsed * self.rate) - self.sent
+            if due <= 0:
+                time.sleep(0.005)
+                continue
+            for _ in range(min(due, burst)):
+                pid = self.patient_ids[i % len(self.patient_ids)]
+                i += 1
+                self.broker.publish(f"vitals/{pid}", self._reading(pid))
+                self.sent += 1
+
+    def start(self, seconds: float = float("inf")):
+        self._thread = threading.Thread(target=self.run, args=(seconds,), name="device-sim", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline ingestion load test (simulator -> broker -> store)")
+    parser.add_argument("--store", required=True, help="vitals store directory to write into")
+    parser.add_argument("--patients", type=int, default=200)
+    parser.add_argument("--rate", type=float, default=5000, help="readings per second")
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args(argv)
+
+    broker = LocalBroker()
+    cache = get_cache(args.store)
+    cache.store.init()
+    cache.windows()  # initial sync from the store; the pipeline keeps it current from here
+    pipeline = IngestionPipeline(broker, cache.store, cache=cache).start()
+    sim = DeviceSimulator(broker, [f"SIM{i:05d}" for i in range(args.patients)], rate=args.rate)
+    t0 = time.monotonic()
+    sim.run(args.seconds)
+    pipeline.stop()
+    elapsed = time.monotonic() - t0
+    print(json.dumps(dict(pipeline.stats, sent=sim.sent, seconds=round(elapsed, 3),
+                          per_second=round(pipeline.stats["written"] / elapsed, 1))))
+
+
+if __name__ == "__main__":
+    main()
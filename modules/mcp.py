@@ -1,54 +1,176 @@
+import asyncio, contextvars
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
+from modules.security import PURPOSE_NOTIFY
+from modules.metrics import span
 # from .security import require_scope  # Uncomment if real scopes are enforced
 
+DEFAULT_TIMEOUT = 5.0        # seconds per tool call
+DEFAULT_CONCURRENCY = 8      # parallel calls in a batch
+MAX_WORKERS = 32             # threads shared by all async calls of one registry
+
 @dataclass
 class ToolCallResult:
     ok: bool
     message: str
     payload: Optional[dict] = None
 
+def _no_consent(patient_id) -> ToolCallResult:
+    return ToolCallResult(False, f"Consent required before alerting a doctor about {patient_id}", {})
+
 class MCPRegistry:
-    def __init__(self):
+    def __init__(self, max_workers: int = MAX_WORKERS, vitals=None, consent=None, alerts=None, patients=None):
         self.tools = [
             {"name": "get_vitals", "description": "Return current vitals for a patient", "scope": "vitals:read"},
             {"name": "check_thresholds", "description": "Check current vitals against risk thresholds", "scope": "vitals:read"},
+            {"name": "get_trend", "description": "Rolling mean/min/max/slope and early-warning score over recent readings", "scope": "vitals:read"},
             {"name": "alert_doctor", "description": "Notify doctor about an event (requires consent)", "scope": "alerts:write"},
         ]
-        self.patients: Dict[str, Dict[str, Any]] = {}
+        # PatientCatalog (or a plain {patient_id: record} dict): demographics joined with latest vitals
+        self.patients = patients if patients is not None else {}
+        self.vitals = vitals  # optional VitalsCache; latest readings are served from it
+        self.consent = consent  # optional ConsentManager; alert_doctor requires consent when set
+        self.alerts = alerts    # optional AlertDispatcher; alert_doctor queues notifications on it
+        self._handlers = {
+            "get_vitals": self._get_vitals,
+            "check_thresholds": self._check_thresholds,
+            "get_trend": self._get_trend,
+            "alert_doctor": self._alert_doctor,
+        }
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="mcp-tool")
 
     def get_patient(self, patient_id: str) -> Optional[Dict[str, Any]]:
-        return self.patients.get(patient_id)
+        p = self.patients.get(patient_id)
+        if p is None and self.vitals is not None:
+            latest = self.vitals.latest(patient_id)
+            if latest is not None:
+                p = {"vitals": latest}
+        return p
 
     def list_tools(self):
         return self.tools
 
-    def execute(self, tool_name: str, patient_id: Optional[str] = None, prompt: Optional[str] = None) -> ToolCallResult:
-        if tool_name == "get_vitals":
-            p = self.get_patient(patient_id)
-            if not p:
-                return ToolCallResult(False, f"Patient {patient_id} not found", {})
-            return ToolCallResult(True, "Vitals retrieved", p.get("vitals", {}))
-
-        if tool_name == "check_thresholds":
-            p = self.get_patient(patient_id)
-            if not p:
-                return ToolCallResult(False, f"Patient {patient_id} not found", {})
-
-            v = p.get("vitals", {})
-            alerts = []
-            if v.get("spo2", 100) < 95:
-                alerts.append("Low SpO₂ detected")
-            hr = v.get("heart_rate")
-            if hr is not None and hr > 120:
-                alerts.append("High heart rate detected")
-            temp = v.get("temperature")
-            if temp is not None and temp > 38:
-                alerts.append("High fever detected")
-
-            return ToolCallResult(True, "Thresholds checked", {"alerts": alerts})
-
-        if tool_name == "alert_doctor":
+    def tool_scope(self, tool_name: str) -> Optional[str]:
+        for t in self.tools:
+            if t["name"] == tool_name:
+                return t["scope"]
+        return None
+
+    # ---- Tools ----
+    def _get_vitals(self, patient_id: Optional[str], prompt: Optional[str]) -> ToolCallResult:
+        p = self.get_patient(patient_id)
+        if not p:
+            return ToolCallResult(False, f"Patient {patient_id} not found", {})
+        if not p.get("vitals"):
+            return ToolCallResult(False, f"No vitals recorded for patient {patient_id}", {})
+        return ToolCallResult(True, "Vitals retrieved", p["vitals"])
+
+    def _check_thresholds(self, patient_id: Optional[str], prompt: Optional[str]) -> ToolCallResult:
+        p = self.get_patient(patient_id)
+        if not p:
+            return ToolCallResult(False, f"Patient {patient_id} not found", {})
+
+        from modules import thresholds  # numpy/pandas stay unloaded until vitals are needed
+        levels = thresholds.check_reading(p.get("vitals") or {})
+        alerts = thresholds.messages(levels)
+        payload = {"alerts": alerts}
+        trend = self._trend(patient_id)
+        if trend is not None:
+            payload["ews"] = trend["ews"]
+
+        return ToolCallResult(True, "Thresholds checked", payload)
+
+    def _trend(self, patient_id, window=None):
+        if self.vitals is None:
+            return None
+        return self.vitals.trend(patient_id, window)
+
+    def _get_trend(self, patient_id: Optional[str], prompt: Optional[str]) -> ToolCallResult:
+        trend = self._trend(patient_id)
+        if trend is None:
+            return ToolCallResult(False, f"No trend data for patient {patient_id}", {})
+        return ToolCallResult(True, "Trend computed", trend)
+
+    def _alert_doctor(self, patient_id: Optional[str], prompt: Optional[str]) -> ToolCallResult:
+        if self.consent is not None and not self.consent.has_consent(patient_id, PURPOSE_NOTIFY):
+            return _no_consent(patient_id)
+        return self._send_alert(patient_id, prompt)
+
+    def _send_alert(self, patient_id: Optional[str], prompt: Optional[str]) -> ToolCallResult:
+        if self.alerts is None:
             return ToolCallResult(True, "Doctor alerted successfully", {})
+        status = self.alerts.submit(patient_id, prompt or "Doctor alert requested by agent", kind="agent")
+        if status == "queued":
+            return ToolCallResult(True, "Doctor alert queued", {"status": status})
+        if status == "duplicate":
+            return ToolCallResult(True, "Doctor already alerted recently", {"status": status})
+        return ToolCallResult(False, "Alert queue is full", {"status": status})
+
+    # ---- Dispatch ----
+    @staticmethod
+    def _call(fn, tool_name, patient_id, prompt, trace_id=None) -> ToolCallResult:
+        # Every tool call is timed (per tool) and tagged with the caller's trace id.
+        # A handler error (e.g. a ShardError) fails this call only, never its batch.
+        with span("mcp_tool", trace_id, tool=tool_name):
+            try:
+                return fn(patient_id, prompt)
+            except Exception as e:
+                return ToolCallResult(False, f"{tool_name} failed for {patient_id}: {type(e).__name__}: {e}", {})
+
+    def execute(self, tool_name: str, patient_id: Optional[str] = None, prompt: Optional[str] = None,
+                trace_id: Optional[str] = None) -> ToolCallResult:
+        handler = self._handlers.get(tool_name)
+        if handler is None:
+            return ToolCallResult(False, f"Unknown tool: {tool_name}", {})
+        return self._call(handler, tool_name, patient_id, prompt, trace_id)
+
+    async def _run(self, fn, tool_name, patient_id, prompt, timeout, trace_id=None) -> ToolCallResult:
+        # Runs fn on a worker thread; on timeout the caller gets a failed result
+        # (the thread itself cannot be interrupted and finishes in the background).
+        try:
+            loop = asyncio.get_running_loop()
+            ctx = contextvars.copy_context()  # the worker thread joins the caller's trace
+            return await asyncio.wait_for(
+                loop.run_in_executor(self._executor, ctx.run, self._call, fn, tool_name, patient_id, prompt, trace_id),
+                timeout)
+        except asyncio.TimeoutError:
+            return ToolCallResult(False, f"{tool_name} timed out after {timeout}s", {})
+
+    async def execute_async(self, tool_name: str, patient_id: Optional[str] = None, prompt: Optional[str] = None,
+                            timeout: float = DEFAULT_TIMEOUT, trace_id: Optional[str] = None) -> ToolCallResult:
+        handler = self._handlers.get(tool_name)
+        if handler is None:
+            return ToolCallResult(False, f"Unknown tool: {tool_name}", {})
+        return await self._run(handler, tool_name, patient_id, prompt, timeout, trace_id)
+
+    async def execute_batch(self, tool_name: str, patient_ids: List[str], prompt: Optional[str] = None,
+                            max_concurrency: int = DEFAULT_CONCURRENCY,
+                            timeout: float = DEFAULT_TIMEOUT, trace_id: Optional[str] = None) -> List[ToolCallResult]:
+        # Fan one tool out over many patients; results come back in submission order.
+        handler = self._handlers.get(tool_name)
+        if handler is None:
+            return [ToolCallResult(False, f"Unknown tool: {tool_name}", {}) for _ in patient_ids]
+        allowed = None
+        if tool_name == "alert_doctor" and self.consent is not None:
+            # one bulk consent query instead of one per patient
+            try:
+                allowed = self.consent.valid_for(patient_ids, PURPOSE_NOTIFY)
+            except Exception as e:
+                return [ToolCallResult(False, f"Consent lookup failed: {type(e).__name__}: {e}", {}) for _ in patient_ids]
+            handler = self._send_alert
+        sem = asyncio.Semaphore(max_concurrency)
+
+        async def one(pid):
+            if allowed is not None and pid not in allowed:
+                return _no_consent(pid)
+            async with sem:
+                return await self._run(handler, tool_name, pid, prompt, timeout, trace_id)
+
+        return list(await asyncio.gather(*(one(pid) for pid in patient_ids)))
 
-        return ToolCallResult(False, f"Unknown tool: {tool_name}", {})
+    def execute_many(self, tool_name: str, patient_ids: List[str], prompt: Optional[str] = None,
+                     max_concurrency: int = DEFAULT_CONCURRENCY,
+                     timeout: float = DEFAULT_TIMEOUT, trace_id: Optional[str] = None) -> List[ToolCallResult]:
+        # Blocking wrapper for callers without an event loop (e.g. Streamlit scripts).
+        return asyncio.run(self.execute_batch(tool_name, patient_ids, prompt, max_concurrency, timeout, trace_id))
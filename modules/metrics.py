@@ -0,0 +1,207 @@
+import contextvars, os, threading, time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+
+# In-process latency metrics. Timing spans feed fixed-bucket histograms keyed by
+# (name, labels); recording is a bisect plus a few integer updates under one
+# lock, so spans can wrap hot paths. Exposed as Prometheus text (MCP server)
+# and as a summary table (app "Performance" tab).
+#
+# A span opened with a trace_id makes it the current trace (a ContextVar) for
+# everything nested inside it, so inner spans (threshold_eval, vitals_load,
+# shard_call, query, ...) are tagged without threading the id through every
+# call. Work handed to a thread pool carries it via contextvars.copy_context().
+
+NAMESPACE = "vitalguard"
+# upper bounds in seconds; the implicit last bucket is +Inf
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+RECENT_SPANS = 256
+
+HELP = {
+    "vitals_load": "Building the shared vitals repository from the store",
+    "patient_filter": "Selecting one patient's readings",
+    "threshold_eval": "Evaluating threshold levels",
+    "chart_render": "Rendering a trend chart PNG",
+    "mcp_tool": "MCP tool handler execution",
+    "rpc_request": "JSON-RPC request handling in the MCP server",
+    "page_render": "One Streamlit script run",
+    "query": "Answering a chatbot query (cache misses)",
+    "query_index": "Building the chatbot query index for a data version",
+    "shard_call": "Round trip to a vitals shard worker",
+}
+
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def quantile(self, q: float) -> float:
+        # Linear interpolation inside the bucket holding the q-th observation.
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            if c and seen + c >= rank:
+                lo = BUCKETS[i - 1] if i else 0.0
+                hi = BUCKETS[i] if i < len(BUCKETS) else self.max
+                return min(lo + (hi - lo) * (rank - seen) / c, self.max)
+            seen += c
+        return self.max
+
+
+_trace_id = contextvars.ContextVar("vitalguard_trace_id", default=None)
+
+
+def current_trace_id():
+    return _trace_id.get()
+
+
+@contextmanager
+def trace(trace_id):
+    # Make trace_id current for the block without recording a span of its own.
+    token = _trace_id.set(trace_id)
+    try:
+        yield trace_id
+    finally:
+        _trace_id.reset(token)
+
+
+class _Span:
+    __slots__ = ("metrics", "name", "labels", "trace_id", "t0", "token")
+
+    def __init__(self, metrics, name, labels, trace_id):
+        self.metrics, self.name, self.labels, self.trace_id = metrics, name, labels, trace_id
+        self.token = None
+
+    def __enter__(self):
+        if self.trace_id is None:
+            self.trace_id = _trace_id.get()
+        elif self.trace_id != _trace_id.get():
+            self.token = _trace_id.set(self.trace_id)  # nested spans inherit it
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.observe(self.name, time.perf_counter() - self.t0, self.trace_id, self.labels, exc_type is None)
+        if self.token is not None:
+            _trace_id.reset(self.token)
+            self.token = None
+        return False
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+class Metrics:
+    def __init__(self, enabled: bool = True, recent: int = RECENT_SPANS):
+        self.enabled = enabled
+        self._hists = {}                      # (name, labels) -> Histogram
+        self._recent = deque(maxlen=recent)   # (ts, name, labels, seconds, trace_id, ok)
+        self._lock = threading.Lock()
+
+    def span(self, name: str, trace_id: str = None, **labels):
+        # with metrics.span("chart_render", trace_id=tid, patient="P001"): ...
+        # Without trace_id the span joins the current trace, if any.
+        if not self.enabled:
+            return _NO_SPAN
+        return _Span(self, name, tuple(sorted(labels.items())), trace_id)
+
+    def observe(self, name: str, seconds: float, trace_id: str = None, labels=(), ok: bool = True):
+        key = (name, labels)
+        i = bisect_left(BUCKETS, seconds)
+        with self._lock:
+            h = self._hists.get(key)
+            if h is None:
+                h = self._hists[key] = Histogram()
+            h.counts[i] += 1
+            h.sum += seconds
+            h.count += 1
+            if seconds > h.max:
+                h.max = seconds
+            self._recent.append((time.time(), name, labels, seconds, trace_id, ok))
+
+    def reset(self):
+        with self._lock:
+            self._hists.clear()
+            self._recent.clear()
+
+    def _snapshot(self):
+        with self._lock:
+            return [(name, labels, list(h.counts), h.sum, h.count, h.max) for (name, labels), h in sorted(self._hists.items())]
+
+    # ---- Views ----
+    def summary(self):
+        # One row per (name, labels) with count, mean and estimated percentiles in ms.
+        rows = []
+        for name, labels, counts, total, count, mx in self._snapshot():
+            h = Histogram()
+            h.counts, h.sum, h.count, h.max = counts, total, count, mx
+            rows.append({
+                "span": name,
+                "labels": ",".join(f"{k}={v}" for k, v in labels),
+                "count": count,
+                "mean_ms": 1e3 * total / count if count else 0.0,
+                "p50_ms": 1e3 * h.quantile(0.50),
+                "p95_ms": 1e3 * h.quantile(0.95),
+                "p99_ms": 1e3 * h.quantile(0.99),
+                "max_ms": 1e3 * mx,
+            })
+        return rows
+
+    def recent(self, limit: int = None, trace_id: str = None):
+        # Newest spans first, optionally only those of one trace.
+        with self._lock:
+            spans = list(self._recent)
+        spans.reverse()
+        if trace_id is not None:
+            spans = [s for s in spans if s[4] == trace_id]
+        return [
+            {"ts": ts, "span": name, "labels": dict(labels), "ms": 1e3 * seconds, "trace_id": tid, "ok": ok}
+            for ts, name, labels, seconds, tid, ok in spans[:limit]
+        ]
+
+    def render_prometheus(self) -> str:
+        # Prometheus text exposition format (version 0.0.4).
+        lines, described = [], set()
+        for name, labels, counts, total, count, _ in self._snapshot():
+            metric = f"{NAMESPACE}_{name}_seconds"
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {metric} {HELP.get(name, name)}")
+                lines.append(f"# TYPE {metric} histogram")
+            base = [f'{k}="{_escape(v)}"' for k, v in labels]
+            cum = 0
+            for bound, c in zip(BUCKETS + (None,), counts):
+                cum += c
+                le = 'le="%s"' % ("+Inf" if bound is None else repr(bound))
+                lines.append(f"{metric}_bucket{{{','.join(base + [le])}}} {cum}")
+            sel = "{" + ",".join(base) + "}" if base else ""
+            lines.append(f"{metric}_sum{sel} {total!r}")
+            lines.append(f"{metric}_count{sel} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+# Process-wide instance; VITALGUARD_METRICS=0 turns spans into no-ops.
+metrics = Metrics(enabled=os.environ.get("VITALGUARD_METRICS", "1") != "0")
+span = metrics.span
@@ -0,0 +1,121 @@
+import csv, os, threading, time
+from pathlib import Path
+
+# Patient catalog: demographics from patients.csv (tab-separated) held in one
+# dict keyed by patient_id, joined on demand with the latest reading from the
+# shared vitals cache. The file is re-read only when its mtime changes.
+
+FIELDS = ("patient_id", "name", "age", "gender", "condition")
+RECHECK_INTERVAL = 1.0   # seconds between mtime checks of the CSV
+
+
+class Demographics:
+    __slots__ = ("patient_id", "name", "age", "gender", "condition")
+
+    def __init__(self, patient_id: str, name: str, age, gender: str, condition: str):
+        self.patient_id = patient_id
+        self.name = name
+        self.age = age
+        self.gender = gender
+        self.condition = condition
+
+    def as_dict(self):
+        return {f: getattr(self, f) for f in FIELDS}
+
+
+def _age(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def read_catalog(path):
+    # {patient_id: Demographics}; rows without an id are skipped, file order kept.
+    index = {}
+    with open(path, "r", newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f, delimiter="\t"):
+            pid = (row.get("patient_id") or "").strip()
+            if pid:
+                index[pid] = Demographics(pid, (row.get("name") or "").strip() or f"Patient {pid}",
+                                          _age(row.get("age")), (row.get("gender") or "").strip(),
+                                          (row.get("condition") or "").strip())
+    return index
+
+
+class PatientCatalog:
+    def __init__(self, path, vitals=None):
+        self.path = Path(path)
+        self.vitals = vitals        # optional VitalsCache / ShardPool for the latest-reading join
+        self._index = {}
+        self._mtime = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+        self._joined = {}           # patient_id -> record, valid for one (catalog, vitals) version
+        self._joined_key = None
+
+    def _refresh(self):
+        now = time.monotonic()
+        if now - self._checked < RECHECK_INTERVAL and self._mtime is not None:
+            return self._index
+        with self._lock:
+            self._checked = now
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except FileNotFoundError:
+                mtime = 0
+            if mtime != self._mtime:
+                self._index = read_catalog(self.path) if mtime else {}
+                self._mtime = mtime
+        return self._index
+
+    # ---- Demographics ----
+    def demographics(self, patient_id):
+        return self._refresh().get(patient_id)
+
+    def __contains__(self, patient_id):
+        return patient_id in self._refresh()
+
+    def __len__(self):
+        return len(self._refresh())
+
+    def ids(self):
+        # Catalog patients in file order, then patients that only have vitals.
+        ids = list(self._refresh())
+        if self.vitals is not None:
+            known = set(ids)
+            ids += [pid for pid in self.vitals.patient_ids() if pid not in known]
+        return ids
+
+    def label(self, patient_id) -> str:
+        d = self.demographics(patient_id)
+        return f"{patient_id} · {d.name}" if d is not None else str(patient_id)
+
+    # ---- Joined records ----
+    def get(self, patient_id, default=None):
+        # Demographics + latest vitals as one dict, or `default` when the
+        # patient is in neither source. Built once per patient and per catalog and
+        # vitals version; the memo is only read and filled under the lock.
+        self._refresh()
+        version = self.vitals.version() if self.vitals is not None else None
+        with self._lock:
+            index, key = self._index, (self._mtime, version)
+            if key != self._joined_key:
+                self._joined, self._joined_key = {}, key
+            record = self._joined.get(patient_id)
+        if record is not None:
+            return record
+        d = index.get(patient_id)
+        latest = self.vitals.latest(patient_id) if self.vitals is not None else None
+        if d is None and latest is None:
+            return default
+        record = d.as_dict() if d is not None else {"patient_id": patient_id, "name": f"Patient {patient_id}",
+                                                    "age": None, "gender": "", "condition": ""}
+        record["vitals"] = latest or {}
+        with self._lock:
+            if self._joined_key == key:
+                self._joined[patient_id] = record
+        return record
+
+    def records(self, patient_ids=None):
+        return [r for r in (self.get(pid) for pid in (patient_ids if patient_ids is not None else self.ids())) if r]
@@ -0,0 +1,311 @@
+import operator, re, threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Tuple
+import numpy as np, pandas as pd
+from modules import thresholds
+from modules.metrics import span, trace
+
+# Structured queries behind the chatbot panel. Free text is parsed into a
+# Query; the engine answers it from a per-data-version ward index (row
+# timestamps, vitals and row-level threshold levels, laid out in the
+# repository's per-patient slices) instead of masking the whole history
+# DataFrame. Answers are cached per (query, data version).
+#
+#   "list patients"                      "latest vitals for P003"
+#   "critical patients in the last hour" "patients with spo2 < 90 or hr > 130"
+#   "vitals for Ravi in the past 30 min" "warning patients"
+#
+# Time windows are anchored at the newest reading in the ward, so replayed
+# data answers the same way live data does.
+
+CACHE_ENTRIES = 512
+
+VITAL_WORDS = {
+    "spo2": "spo2", "spo₂": "spo2", "oxygen": "spo2", "o2": "spo2",
+    "heart rate": "heart_rate", "heart_rate": "heart_rate", "hr": "heart_rate", "pulse": "heart_rate",
+    "temperature": "temp", "temp": "temp",
+    "systolic": "bp_systolic", "diastolic": "bp_diastolic",
+}
+OPERATORS = {
+    "<=": "le", ">=": "ge", "<": "lt", ">": "gt",
+    "below": "lt", "under": "lt", "less than": "lt", "lower than": "lt",
+    "above": "gt", "over": "gt", "more than": "gt", "greater than": "gt", "higher than": "gt",
+}
+UNITS = {"s": 1, "sec": 1, "second": 1, "m": 60, "min": 60, "minute": 60, "h": 3600, "hr": 3600, "hour": 3600, "d": 86400, "day": 86400}
+QUERY_FIELDS = ["heart_rate", "spo2", "temp", "bp_systolic", "bp_diastolic"]
+
+_alt = lambda words: "|".join(re.escape(w) for w in sorted(words, key=len, reverse=True))
+_PRED_RE = re.compile(rf"\b({_alt(VITAL_WORDS)})\s*(?:is\s+|of\s+)?({_alt(OPERATORS)})\s*(-?\d+(?:\.\d+)?)")
+_WINDOW_RE = re.compile(r"\b(?:last|past|previous)\s+(\d+(?:\.\d+)?)?\s*(seconds?|secs?|minutes?|mins?|hours?|hrs?|days?|[smhd])\b")
+_PID_RE = re.compile(r"\bp\d+\b", re.I)
+
+
+@dataclass(frozen=True)
+class Query:
+    kind: str                                   # list | latest | level | filter | unknown
+    patient_id: Optional[str] = None
+    level: int = thresholds.CRITICAL
+    predicates: Tuple[Tuple[str, str, float], ...] = ()   # (field, op, value)
+    any_of: bool = False                        # predicates joined by "or"
+    window: Optional[float] = None              # seconds; None = latest reading only
+
+
+@dataclass
+class QueryResult:
+    query: Query
+    text: str
+    patient_ids: list
+    rows: list
+
+
+def _window(text):
+    m = _WINDOW_RE.search(text)
+    if m is None:
+        return None
+    unit = m.group(2).rstrip("s") or "s"
+    return float(m.group(1) or 1) * UNITS.get(unit, UNITS.get(unit[:3], 1))
+
+
+def _patient(text, catalog):
+    m = _PID_RE.search(text)
+    if m is not None:
+        return m.group(0).upper()
+    if catalog is not None:
+        low = text.lower()
+        words = set(re.findall(r"\w+", low))
+        for pid in catalog.ids():
+            d = catalog.demographics(pid)
+            if d is not None and d.name and (d.name.lower() in low or d.name.split()[0].lower() in words):
+                return pid
+    return None
+
+
+def parse(text: str, catalog=None) -> Query:
+    low = " ".join(text.lower().split())
+    window = _window(low)
+    preds = tuple((VITAL_WORDS[v], OPERATORS[op], float(x)) for v, op, x in _PRED_RE.findall(low))
+    if preds:
+        return Query("filter", predicates=preds, any_of=" or " in low, window=window)
+    if re.search(r"\b(critical|warning|at risk|abnormal|alert(?:ing)?)\b", low):
+        level = thresholds.CRITICAL if "critical" in low else thresholds.WARNING
+        return Query("level", level=level, window=window)
+    if re.search(r"\b(list|all|show)\b.*\bpatients\b|\bpatients\b.*\b(list|available)\b", low):
+        return Query("list")
+    pid = _patient(text, catalog)
+    if pid is not None or re.search(r"\b(latest|vitals|readings?|status)\b", low):
+        return Query("latest", patient_id=pid, window=window)
+    return Query("unknown")
+
+
+def _search_slices(values, starts, stops, x):
+    # a + np.searchsorted(values[a:b], x) for every sorted slice [a, b) at once:
+    # one binary search per slice, run in lock-step across slices.
+    lo, hi = starts.copy(), stops.copy()
+    active = lo < hi
+    while active.any():
+        mid = (lo + hi) // 2
+        right = active & (values[np.minimum(mid, len(values) - 1)] < x)
+        lo = np.where(right, mid + 1, lo)
+        hi = np.where(active & ~right, mid, hi)
+        active = lo < hi
+    return lo
+
+
+class _Part:
+    # One patient's index arrays, built from (and valid for) one repository frame.
+    __slots__ = ("frame", "ts", "cols", "levels")
+
+    def __init__(self, frame, ts, cols, levels):
+        self.frame, self.ts, self.cols, self.levels = frame, ts, cols, levels
+
+
+class _WardIndex:
+    # Column arrays of one repository version (patients concatenated in
+    # repository order) and each patient's slice bounds. Per-patient parts are
+    # carried over from the previous index: unchanged patients are reused and,
+    # when a frame only grew, just the appended rows are threshold-evaluated.
+    def __init__(self, repo, previous=None):
+        self.repo = repo
+        self.parts = self._parts(repo.frames(), previous.parts if previous is not None else {})
+        self.pids = np.array(list(self.parts), dtype=object)
+        lengths = np.array([len(p.ts) for p in self.parts.values()], dtype=np.int64)
+        self.stops = np.cumsum(lengths)
+        self.starts = self.stops - lengths
+        self.slices = {pid: (int(a), int(b)) for pid, a, b in zip(self.pids, self.starts, self.stops)}
+        self.n = int(lengths.sum())
+        parts = list(self.parts.values())
+        if self.n:
+            self.ts = np.concatenate([p.ts for p in parts])
+            self.cols = {f: np.concatenate([p.cols[f] for p in parts]) for f in parts[0].cols}
+            self.levels = np.concatenate([p.levels for p in parts])
+            self.t_max = int(self.ts[self.stops - 1].max())  # each slice is sorted
+        else:
+            self.ts, self.cols, self.levels, self.t_max = np.zeros(0, np.int64), {}, np.zeros(0, np.int8), 0
+
+    @staticmethod
+    def _parts(frames, old):
+        parts, pending = {}, []   # pending: (pid, frame, ts, reusable prefix part or None)
+        for pid, frame in frames.items():
+            prev = old.get(pid)
+            if prev is not None and prev.frame is frame:
+                parts[pid] = prev
+                continue
+            ts = frame["timestamp"].to_numpy("datetime64[ns]").view(np.int64)
+            if prev is not None and not (len(prev.ts) <= len(ts) and np.array_equal(prev.ts, ts[:len(prev.ts)])):
+                prev = None  # rewritten or back-filled: evaluate all of it again
+            parts[pid] = None  # keeps repository order; filled in below
+            pending.append((pid, frame, ts, prev))
+        if pending:
+            # one threshold pass over the new rows of every changed patient
+            new = [frame.iloc[len(prev.ts) if prev is not None else 0:] for _, frame, _, prev in pending]
+            levels = thresholds.evaluate(pd.concat(new) if len(new) > 1 else new[0]).to_numpy().max(axis=1).astype(np.int8)
+            cuts = np.cumsum([len(rows) for rows in new])[:-1]
+            for (pid, frame, ts, prev), rows, lv in zip(pending, new, np.split(levels, cuts)):
+                cols = {f: rows[f].to_numpy(dtype=np.float64) for f in QUERY_FIELDS if f in rows}
+                if prev is not None:
+                    cols = {f: np.concatenate((prev.cols[f], v)) for f, v in cols.items()}
+                    lv = np.concatenate((prev.levels, lv))
+                parts[pid] = _Part(frame, ts, cols, lv)
+        return parts
+
+    def window_rows(self, window):
+        # Rows each patient contributes: its newest reading, or every reading
+        # within `window` seconds of the newest one in the ward (a binary search
+        # per slice). Returns (positions of patients with rows, segment offsets
+        # into rows, row indices), ready for ufunc.reduceat.
+        if window is None:
+            everyone = np.arange(len(self.pids))
+            return everyone, everyone, self.stops - 1
+        lo = _search_slices(self.ts, self.starts, self.stops, self.t_max - int(window * 1e9))
+        counts = self.stops - lo
+        has = np.flatnonzero(counts)
+        counts = counts[has]
+        offsets = np.cumsum(counts) - counts
+        rows = np.repeat(lo[has] - offsets, counts) + np.arange(int(counts.sum()))
+        return has, offsets, rows
+
+
+_COMPARE = {"lt": operator.lt, "le": operator.le, "gt": operator.gt, "ge": operator.ge}
+_SYMBOL = {"lt": "<", "le": "<=", "gt": ">", "ge": ">="}
+
+
+def _describe_window(window):
+    if window is None:
+        return "(latest readings)"
+    for unit, secs in (("day", 86400), ("hour", 3600), ("minute", 60)):
+        if window >= secs and window % secs == 0:
+            n = int(window // secs)
+            return f"in the last {unit}" if n == 1 else f"in the last {n} {unit}s"
+    return f"in the last {window:g} seconds"
+
+
+class QueryEngine:
+    def __init__(self, vitals, catalog=None, max_entries: int = CACHE_ENTRIES):
+        self.vitals = vitals        # VitalsCache
+        self.catalog = catalog      # optional PatientCatalog for names and name lookup
+        self.max_entries = max_entries
+        self._index = None
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def _ward(self):
+        repo = self.vitals.repository()
+        index = self._index
+        if index is not None and index.repo is repo:
+            return index
+        with span("query_index"):
+            index = _WardIndex(repo, index)
+        with self._lock:
+            self._index = index
+            self._results.clear()  # new data version
+        return index
+
+    def ask(self, text: str, trace_id: str = None) -> QueryResult:
+        return self.run(parse(text, self.catalog), trace_id)
+
+    def run(self, query: Query, trace_id: str = None) -> QueryResult:
+        if trace_id is not None:
+            with trace(trace_id):  # index rebuilds and vitals loads join the trace too
+                return self.run(query)
+        ward = self._ward()
+        with self._lock:
+            hit = self._results.get(query)
+            if hit is not None:
+                self._results.move_to_end(query)
+                self.hits += 1
+                return hit
+            self.misses += 1
+        with span("query", kind=query.kind):
+            result = getattr(self, f"_{query.kind}")(query, ward)
+        with self._lock:
+            if self._index is ward:
+                self._results[query] = result
+                while len(self._results) > self.max_entries:
+                    self._results.popitem(last=False)
+        return result
+
+    def _label(self, pid):
+        return self.catalog.label(pid) if self.catalog is not None else str(pid)
+
+    def _latest_rows(self, ward, ids):
+        return [dict(ward.repo.latest(pid), name=self._label(pid)) for pid in ids]
+
+    # ---- Query kinds ----
+    def _unknown(self, q, ward):
+        return QueryResult(q, "I couldn’t understand your question. Try 'critical patients in the last hour', "
+                              "'latest vitals for P003' or 'patients with spo2 < 90'.", [], [])
+
+    def _list(self, q, ward):
+        ids = self.catalog.ids() if self.catalog is not None else list(ward.pids)
+        return QueryResult(q, f"Patients available: {', '.join(self._label(p) for p in ids)}", ids, [])
+
+    def _latest(self, q, ward):
+        pid = q.patient_id
+        if pid is None:
+            return QueryResult(q, "Which patient? e.g. 'latest vitals for P003'.", [], [])
+        if pid not in ward.repo:
+            return QueryResult(q, f"No vitals recorded for {self._label(pid)}.", [pid], [])
+        if q.window is None:
+            row = ward.repo.latest(pid)
+            return QueryResult(q, f"Latest vitals for {self._label(pid)}: HR {row['heart_rate']} bpm, "
+                                  f"SpO₂ {row['spo2']} %, BP {row['bp']}, temp {row['temp']} "
+                                  f"({row['timestamp']}).", [pid], [row])
+        # per-patient index: binary search inside the patient's slice
+        a, b = ward.slices[pid]
+        lo = int(np.searchsorted(ward.ts[a:b], ward.t_max - int(q.window * 1e9), side="left"))
+        rows = ward.repo.history(pid).iloc[lo:].to_dict(orient="records")
+        if not rows:
+            return QueryResult(q, f"No readings for {self._label(pid)} {_describe_window(q.window)}.", [pid], [])
+        hr = [r["heart_rate"] for r in rows]
+        spo2 = [r["spo2"] for r in rows]
+        return QueryResult(q, f"{len(rows)} readings for {self._label(pid)} {_describe_window(q.window)}: "
+                              f"HR {min(hr)}–{max(hr)} bpm, SpO₂ {min(spo2)}–{max(spo2)} %.", [pid], rows)
+
+    def _level(self, q, ward):
+        has, offsets, rows = ward.window_rows(q.window)
+        worst = np.maximum.reduceat(ward.levels[rows], offsets) if len(rows) else ward.levels[:0]
+        ids = ward.pids[has[worst >= q.level]].tolist()
+        name = "critical" if q.level >= thresholds.CRITICAL else "warning or worse"
+        if not ids:
+            return QueryResult(q, f"No patients {name} {_describe_window(q.window)}.", [], [])
+        return QueryResult(q, f"{len(ids)} patients {name} {_describe_window(q.window)}: "
+                              f"{', '.join(self._label(p) for p in ids)}", ids, self._latest_rows(ward, ids))
+
+    def _filter(self, q, ward):
+        # predicates are evaluated on the window's rows only
+        has, offsets, rows = ward.window_rows(q.window)
+        flags = None
+        for field, op, x in q.predicates:
+            values = ward.cols.get(field)
+            cond = _COMPARE[op](values[rows], x) if values is not None else np.zeros(len(rows), dtype=bool)
+            flags = cond if flags is None else (flags | cond if q.any_of else flags & cond)
+        hit = np.logical_or.reduceat(flags, offsets) if len(rows) else np.zeros(0, dtype=bool)
+        ids = ward.pids[has[hit]].tolist()
+        joiner = " or " if q.any_of else " and "
+        desc = joiner.join(f"{f} {_SYMBOL[op]} {x:g}" for f, op, x in q.predicates)
+        if not ids:
+            return QueryResult(q, f"No patients with {desc} {_describe_window(q.window)}.", [], [])
+        return QueryResult(q, f"{len(ids)} patients with {desc} {_describe_window(q.window)}: "
+                              f"{', '.join(self._label(p) for p in ids)}", ids, self._latest_rows(ward, ids))
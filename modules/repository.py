@@ -0,0 +1,87 @@
+import numpy as np, pandas as pd
+from modules.store import FIELDS
+
+LATEST_COLUMNS = ["patient_id", *FIELDS, "bp"]  # columns of latest_row / latest_frame
+
+
+def latest_row(frame):
+    # A patient's newest reading as a dict, plus the "135/90" bp display form.
+    row = frame.iloc[-1].to_dict()
+    row["bp"] = f"{int(row['bp_systolic'])}/{int(row['bp_diastolic'])}"
+    return row
+
+
+def latest_frame(rows) -> pd.DataFrame:
+    # latest_row dicts -> one row per patient, in the given order.
+    latest = pd.DataFrame(list(rows))
+    if latest.empty:
+        latest = pd.DataFrame(columns=LATEST_COLUMNS)
+    return latest
+
+
+class VitalsRepository:
+    # One timestamp-sorted frame per patient, in patient order. The frames are
+    # the vitals cache's own partitions (shared, not copied), so a new data
+    # version only replaces the patients that changed; lookups are dict hits
+    # instead of boolean-mask scans.
+
+    def __init__(self, frames=None, version=None, previous=None):
+        self.version = version  # data version the frames were read at (store.version())
+        self._frames = {pid: frames[pid] for pid in sorted(frames or {}) if len(frames[pid])}
+        self._ids = list(self._frames)
+        self._latest = {}
+        if previous is not None:
+            # keep the memoized latest rows of patients whose frame did not change
+            for pid, row in previous._latest.items():
+                if previous._frames.get(pid) is self._frames.get(pid):
+                    self._latest[pid] = row
+        self._latest_frame = None
+
+    def __contains__(self, patient_id):
+        return patient_id in self._frames
+
+    def __len__(self):
+        return len(self._frames)
+
+    def patient_ids(self):
+        return self._ids
+
+    def frames(self):
+        # patient_id -> that patient's frame, in patient order
+        return self._frames
+
+    def rows(self):
+        return sum(len(f) for f in self._frames.values())
+
+    def to_frame(self) -> pd.DataFrame:
+        # Every reading as one frame. This is a copy; only bulk exports need it.
+        if not self._frames:
+            return pd.DataFrame(columns=["patient_id", "timestamp"])
+        return pd.concat(self._frames.values(), ignore_index=True)
+
+    def history(self, patient_id) -> pd.DataFrame:
+        frame = self._frames.get(patient_id)
+        return frame if frame is not None else pd.DataFrame(columns=["patient_id", "timestamp"])
+
+    def recent(self, patient_id, seconds: float) -> pd.DataFrame:
+        # Rows within `seconds` of the patient's latest reading (binary search, no scan).
+        hist = self.history(patient_id)
+        if hist.empty:
+            return hist
+        ts = hist["timestamp"].to_numpy("datetime64[ns]")
+        start = int(np.searchsorted(ts, ts[-1] - np.timedelta64(int(seconds * 1e9), "ns"), side="left"))
+        return hist.iloc[start:]
+
+    def latest(self, patient_id):
+        # Latest reading as a dict (plus the "135/90" bp display form), memoized per patient.
+        if patient_id not in self._latest:
+            if patient_id not in self._frames:
+                return None
+            self._latest[patient_id] = latest_row(self._frames[patient_id])
+        return self._latest[patient_id]
+
+    def latest_frame(self) -> pd.DataFrame:
+        # One row per patient (their latest reading), in patient order; built once.
+        if self._latest_frame is None:
+            self._latest_frame = latest_frame(self.latest(pid) for pid in self._ids)
+        return self._latest_frame
@@ -1,25 +1,135 @@
-import secrets, time
+import json, secrets, sqlite3, threading, time
 
 # ✅ Toggle for skipping auth in demo mode
 DEMO_MODE = True   # set to False for real OAuth enforcement
 
+DEFAULT_TTL = 3600  # seconds a token stays valid
+CONSENT_TTL = 30 * 24 * 3600  # seconds a captured consent stays valid
+PURGE_INTERVAL = 60  # seconds between sweeps of expired tokens (run from issue())
+PURPOSE_NOTIFY = "notify_doctor"
+
+# Known scopes get fixed bits; unknown ones are assigned the next free bit on first use.
+_SCOPE_BITS = {s: 1 << i for i, s in enumerate(["vitals:read", "alerts:write", "consent:manage", "logs:read"])}
+_bits_lock = threading.Lock()
+
+
+def scope_bit(scope: str) -> int:
+    bit = _SCOPE_BITS.get(scope)
+    if bit is None:
+        with _bits_lock:
+            bit = _SCOPE_BITS.setdefault(scope, 1 << len(_SCOPE_BITS))
+    return bit
+
+
+class Token:
+    __slots__ = ("value", "scopes", "mask", "scopes_str", "expires_at")
+
+    def __init__(self, value: str, scopes, expires_at: float):
+        self.value = value
+        self.scopes = tuple(dict.fromkeys(scopes))  # issue order, de-duplicated
+        self.mask = 0
+        for s in self.scopes:
+            self.mask |= scope_bit(s)
+        self.scopes_str = ",".join(self.scopes)
+        self.expires_at = expires_at
+
+
+class TokenRegistry:
+    # Many concurrent tokens with expiry. authorize() results are cached per
+    # (token, scope) until the token expires or is revoked. Expired tokens of
+    # abandoned sessions are swept at most once per PURGE_INTERVAL, from issue().
+    def __init__(self, ttl: float = DEFAULT_TTL, purge_interval: float = PURGE_INTERVAL):
+        self.ttl = ttl
+        self.purge_interval = purge_interval
+        self._tokens = {}
+        self._decisions = {}   # token -> {scope: (allowed, expires_at)}
+        self._lock = threading.Lock()
+        self._next_purge = 0.0
+
+    def issue(self, scopes, ttl: float = None) -> str:
+        value = secrets.token_hex(16)
+        now = time.time()
+        tok = Token(value, scopes or [], now + (self.ttl if ttl is None else ttl))
+        if now >= self._next_purge:
+            self.purge_expired(now)
+        with self._lock:
+            self._tokens[value] = tok
+        return value
+
+    def revoke(self, value: str):
+        with self._lock:
+            self._tokens.pop(value, None)
+            self._decisions.pop(value, None)
+
+    def get(self, value: str):
+        tok = self._tokens.get(value)
+        if tok is not None and tok.expires_at <= time.time():
+            self.revoke(value)
+            return None
+        return tok
+
+    def authorize(self, value: str, scope: str) -> bool:
+        hit = self._decisions.get(value, {}).get(scope)
+        if hit is not None and hit[1] > time.time():
+            return hit[0]
+        tok = self.get(value)
+        if tok is None:
+            return False
+        allowed = bool(tok.mask & scope_bit(scope))
+        with self._lock:
+            if value in self._tokens:  # not revoked meanwhile
+                self._decisions.setdefault(value, {})[scope] = (allowed, tok.expires_at)
+        return allowed
+
+    def purge_expired(self, now: float = None) -> int:
+        now = time.time() if now is None else now
+        with self._lock:
+            self._next_purge = now + self.purge_interval
+            expired = [v for v, t in self._tokens.items() if t.expires_at <= now]
+            for value in expired:
+                del self._tokens[value]
+                self._decisions.pop(value, None)
+        return len(expired)
+
+
+# Shared by every gateway in the process (and the MCP server).
+tokens = TokenRegistry()
+
 
 class OAuthGateway:
-    def __init__(self):
-        self.token = None
-        self._scopes = []
+    # One session's view onto the shared TokenRegistry.
+    def __init__(self, registry: TokenRegistry = None):
+        self.registry = registry or tokens
+        self._token = None
+
+    @property
+    def token(self):
+        if self._token is not None and self.registry.get(self._token) is None:
+            self._token = None  # expired
+        return self._token
 
-    def issue(self, scopes):
-        self.token = secrets.token_hex(16)
-        self._scopes = scopes or []
-        return self.token
+    def issue(self, scopes, ttl: float = None):
+        if self._token is not None:
+            self.registry.revoke(self._token)
+        self._token = self.registry.issue(scopes, ttl)
+        return self._token
 
     def revoke(self):
-        self.token = None
-        self._scopes = []
+        if self._token is not None:
+            self.registry.revoke(self._token)
+        self._token = None
 
     def scopes(self):
-        return self._scopes
+        tok = self.registry.get(self._token) if self._token else None
+        return list(tok.scopes) if tok else []
+
+    def scopes_str(self) -> str:
+        # Pre-joined once at issue time, for audit entries.
+        tok = self.registry.get(self._token) if self._token else None
+        return tok.scopes_str if tok else ""
+
+    def authorize(self, scope: str) -> bool:
+        return self._token is not None and self.registry.authorize(self._token, scope)
 
 
 def require_scope(gateway: OAuthGateway, scope: str):
@@ -30,22 +140,118 @@ def require_scope(gateway: OAuthGateway, scope: str):
     # 🔒 Normal behavior when DEMO_MODE = False
     if not gateway.token:
         raise PermissionError("Not authenticated. Please connect via OAuth.")
-    if scope not in gateway.scopes():
+    if not gateway.authorize(scope):
         raise PermissionError(f"Missing required scope: {scope}")
 
 
+def require_token_scope(token: str, scope: str, registry: TokenRegistry = None):
+    # Same check for callers that only hold a bearer token (e.g. the MCP server).
+    if DEMO_MODE:
+        return True
+    registry = registry or tokens
+    if token and registry.authorize(token, scope):
+        return True
+    if not token or registry.get(token) is None:
+        raise PermissionError("Not authenticated. Please connect via OAuth.")
+    raise PermissionError(f"Missing required scope: {scope}")
+
+
+_CONSENT_SCHEMA = """
+CREATE TABLE IF NOT EXISTS consents (
+    patient_id  TEXT NOT NULL,
+    purpose     TEXT NOT NULL,
+    note        TEXT,
+    captured_at REAL NOT NULL,
+    expires_at  REAL NOT NULL,
+    revoked     INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS consents_lookup ON consents (patient_id, purpose, expires_at);
+CREATE INDEX IF NOT EXISTS consents_purpose ON consents (purpose, expires_at, patient_id);
+"""
+
+_connections = {}
+_connections_lock = threading.Lock()
+
+
+def _consent_db(path: str):
+    # One connection (and lock) per database file, reused by every manager in the process.
+    with _connections_lock:
+        entry = _connections.get(path)
+        if entry is None:
+            conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            if path != ":memory:":
+                conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_CONSENT_SCHEMA)
+            entry = (conn, threading.Lock())
+            if path != ":memory:":
+                _connections[path] = entry
+        return entry
+
+
 class ConsentManager:
-    def __init__(self):
-        self._consents = {}  # patient_id -> record
+    # Consent records in an embedded SQLite database, indexed by (patient, purpose)
+    # and kept as history; a consent counts while unexpired and not revoked.
+    def __init__(self, path=":memory:", ttl: float = CONSENT_TTL):
+        self.path = str(path)
+        self.ttl = ttl
+        self._conn, self._lock = _consent_db(self.path)
 
-    def capture(self, patient_id: str, purpose: str):
-        self._consents[patient_id] = {
-            "purpose": purpose,
-            "ts": int(time.time())
-        }
+    def _query(self, sql, args=()):
+        with self._lock:
+            return self._conn.execute(sql, args).fetchall()
 
-    def has_consent(self, patient_id: str) -> bool:
-        return patient_id in self._consents
+    def capture(self, patient_id: str, purpose: str = PURPOSE_NOTIFY, note: str = None, ttl: float = None):
+        now = time.time()
+        expires = now + (self.ttl if ttl is None else ttl)
+        self._query(
+            "INSERT INTO consents (patient_id, purpose, note, captured_at, expires_at) VALUES (?, ?, ?, ?, ?)",
+            (patient_id, purpose, note, now, expires),
+        )
+        return {"purpose": purpose, "note": note, "ts": int(now), "expires_at": int(expires)}
+
+    def revoke(self, patient_id: str, purpose: str = None):
+        sql = "UPDATE consents SET revoked = 1 WHERE patient_id = ?"
+        args = (patient_id,)
+        if purpose is not None:
+            sql += " AND purpose = ?"
+            args += (purpose,)
+        self._query(sql, args)
+
+    def has_consent(self, patient_id: str, purpose: str = None) -> bool:
+        sql = "SELECT 1 FROM consents WHERE patient_id = ? AND expires_at > ? AND revoked = 0"
+        args = (patient_id, time.time())
+        if purpose is not None:
+            sql += " AND purpose = ?"
+            args += (purpose,)
+        return bool(self._query(sql + " LIMIT 1", args))
+
+    def valid_for(self, patient_ids, purpose: str = PURPOSE_NOTIFY) -> set:
+        # Bulk check: which of `patient_ids` hold valid consent for `purpose` (one query).
+        ids = list(patient_ids)
+        if not ids:
+            return set()
+        rows = self._query(
+            "SELECT DISTINCT patient_id FROM consents WHERE purpose = ? AND expires_at > ? AND revoked = 0 "
+            "AND patient_id IN (SELECT value FROM json_each(?))",
+            (purpose, time.time(), json.dumps(ids)),
+        )
+        return {r[0] for r in rows}
 
     def get(self, patient_id: str):
-        return self._consents.get(patient_id)
+        # Latest valid record for the patient, or None.
+        rows = self._query(
+            "SELECT purpose, note, captured_at, expires_at FROM consents "
+            "WHERE patient_id = ? AND expires_at > ? AND revoked = 0 ORDER BY captured_at DESC LIMIT 1",
+            (patient_id, time.time()),
+        )
+        if not rows:
+            return None
+        purpose, note, ts, expires = rows[0]
+        return {"purpose": purpose, "note": note, "ts": int(ts), "expires_at": int(expires)}
+
+    def history(self, patient_id: str):
+        rows = self._query(
+            "SELECT purpose, note, captured_at, expires_at, revoked FROM consents WHERE patient_id = ? ORDER BY captured_at",
+            (patient_id,),
+        )
+        return [{"purpose": p, "note": n, "ts": int(t), "expires_at": int(e), "revoked": bool(r)} for p, n, t, e, r in rows]
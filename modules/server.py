@@ -0,0 +1,325 @@
+import argparse, asyncio, json, os, sys, threading
+from pathlib import Path
+from modules.mcp import MCPRegistry, DEFAULT_CONCURRENCY, DEFAULT_TIMEOUT
+from modules import security
+from modules.alerts import AlertDispatcher, FileSink
+from modules.metrics import metrics, span
+from modules.patients import PatientCatalog
+
+# Headless MCP server: JSON-RPC 2.0, one message per line, over stdio or a
+# local socket. Requests on a connection are handled concurrently (pipelined)
+# and answered as they finish, matched by "id". Importing this module pulls in
+# no numpy/pandas/matplotlib: the vitals cache loads on a background thread
+# (or the first call that needs it), so ping/list_tools answer right away.
+#
+#   python -m modules.server --stdio
+#   python -m modules.server --socket /tmp/vitalguard.sock
+#   python -m modules.server --port 8765
+#   python -m modules.server --stdio --metrics-port 9108   # Prometheus scrape at /metrics
+
+STORE_DIR = Path(__file__).resolve().parent.parent / "data" / "vitals_store"
+CONSENT_DB = STORE_DIR.parent / "consent.db"
+ALERTS_FILE = STORE_DIR.parent / "alerts.jsonl"
+PATIENTS_FILE = STORE_DIR.parent / "patients.csv"
+MAX_INFLIGHT = 64
+
+PARSE_ERROR, INVALID_REQUEST, METHOD_NOT_FOUND, INVALID_PARAMS, INTERNAL_ERROR = -32700, -32600, -32601, -32602, -32603
+FORBIDDEN = -32001
+
+_OPT_STR = (str, type(None))
+PARAM_TYPES = {             # checked before dispatch; unknown params are ignored
+    "tool_name": str,
+    "patient_id": _OPT_STR,
+    "patient_ids": list,
+    "prompt": _OPT_STR,
+    "token": _OPT_STR,
+    "trace_id": _OPT_STR,
+    "format": _OPT_STR,
+    "timeout": (int, float),
+    "max_concurrency": int,
+}
+REQUIRED_PARAMS = {         # method -> params it cannot run without
+    "execute": ("tool_name",),
+    "execute_batch": ("tool_name", "patient_ids"),
+}
+
+
+def _json_default(o):
+    if hasattr(o, "item"):       # numpy scalars
+        return o.item()
+    return str(o)                # timestamps and anything else
+
+
+def _result(result):
+    return {"ok": result.ok, "message": result.message, "payload": result.payload}
+
+
+def _error(req_id, code, message):
+    return {"jsonrpc": "2.0", "id": req_id, "error": {"code": code, "message": message}}
+
+
+def _check_params(method, params):
+    # Error message for the first missing or mistyped param, or None.
+    for name in REQUIRED_PARAMS.get(method, ()):
+        if params.get(name) is None:
+            return f"Missing param: {name}"
+    for name, value in params.items():
+        expected = PARAM_TYPES.get(name)
+        if expected is None:
+            continue
+        if not isinstance(value, expected) or (isinstance(value, bool) and name in ("timeout", "max_concurrency")):
+            return f"Invalid param: {name}"
+    if "patient_ids" in params and not all(isinstance(p, str) for p in params["patient_ids"]):
+        return "Invalid param: patient_ids must be a list of strings"
+    if params.get("timeout") is not None and params["timeout"] <= 0:
+        return "Invalid param: timeout must be positive"
+    if params.get("max_concurrency") is not None and params["max_concurrency"] < 1:
+        return "Invalid param: max_concurrency must be at least 1"
+    return None
+
+
+class MCPServer:
+    def __init__(self, registry: MCPRegistry, max_inflight: int = MAX_INFLIGHT):
+        self.registry = registry
+        self.max_inflight = max_inflight
+        self._methods = {
+            "ping": self._ping,
+            "list_tools": self._list_tools,
+            "execute": self._execute,
+            "execute_batch": self._execute_batch,
+            "metrics": self._metrics,
+        }
+
+    # ---- Methods ----
+    async def _ping(self, params):
+        return "pong"
+
+    async def _list_tools(self, params):
+        return self.registry.list_tools()
+
+    async def _metrics(self, params):
+        # Same text a Prometheus scrape of --metrics-port gets; "summary" for a table.
+        if params.get("format") == "summary":
+            return metrics.summary()
+        return metrics.render_prometheus()
+
+    def _authorize(self, params):
+        # Bearer token in params["token"]; checked against the process-wide registry
+        # (skipped in DEMO_MODE). Decisions are cached per (token, scope).
+        scope = self.registry.tool_scope(params["tool_name"])
+        if scope is not None:
+            security.require_token_scope(params.get("token"), scope)
+
+    async def _execute(self, params):
+        self._authorize(params)
+        result = await self.registry.execute_async(
+            params["tool_name"], params.get("patient_id"), params.get("prompt"),
+            timeout=params.get("timeout", DEFAULT_TIMEOUT), trace_id=params.get("trace_id"),
+        )
+        return _result(result)
+
+    async def _execute_batch(self, params):
+        self._authorize(params)
+        results = await self.registry.execute_batch(
+            params["tool_name"], params["patient_ids"], params.get("prompt"),
+            max_concurrency=params.get("max_concurrency", DEFAULT_CONCURRENCY),
+            timeout=params.get("timeout", DEFAULT_TIMEOUT), trace_id=params.get("trace_id"),
+        )
+        return [_result(r) for r in results]
+
+    # ---- JSON-RPC ----
+    async def handle(self, message):
+        if not isinstance(message, dict):
+            return _error(None, INVALID_REQUEST, "Invalid request")
+        reply = await self._dispatch(message, message.get("id"))
+        # A notification (no "id") gets no response at all, not even an error.
+        return reply if "id" in message else None
+
+    async def _dispatch(self, message, req_id):
+        if message.get("jsonrpc") != "2.0" or "method" not in message:
+            return _error(req_id, INVALID_REQUEST, "Invalid request")
+        method = self._methods.get(message["method"])
+        if method is None:
+            return _error(req_id, METHOD_NOT_FOUND, f"Unknown method: {message['method']}")
+        params = message.get("params") or {}
+        if not isinstance(params, dict):
+            return _error(req_id, INVALID_PARAMS, "params must be an object")
+        problem = _check_params(message["method"], params)
+        if problem is not None:
+            return _error(req_id, INVALID_PARAMS, problem)
+        try:
+            with span("rpc_request", params.get("trace_id"), method=message["method"]):
+                result = await method(params)
+        except PermissionError as e:
+            return _error(req_id, FORBIDDEN, str(e))
+        except Exception as e:
+            return _error(req_id, INTERNAL_ERROR, str(e))
+        return {"jsonrpc": "2.0", "id": req_id, "result": result}
+
+    async def handle_line(self, line: bytes):
+        try:
+            message = json.loads(line)
+        except json.JSONDecodeError as e:
+            return _error(None, PARSE_ERROR, str(e))
+        if isinstance(message, list):  # JSON-RPC batch
+            if not message:
+                return _error(None, INVALID_REQUEST, "Empty batch")
+            replies = await asyncio.gather(*(self.handle(m) for m in message))
+            return [r for r in replies if r is not None] or None
+        return await self.handle(message)
+
+    async def serve(self, readline, write):
+        # readline: coroutine returning one line (b"" at EOF); write: coroutine taking bytes.
+        inflight = asyncio.Semaphore(self.max_inflight)
+        write_lock = asyncio.Lock()
+        tasks = set()
+
+        async def respond(line):
+            try:
+                reply = await self.handle_line(line)
+                if reply is not None:
+                    data = json.dumps(reply, default=_json_default).encode() + b"\n"
+                    async with write_lock:
+                        await write(data)
+            finally:
+                inflight.release()
+
+        while True:
+            line = await readline()
+            if not line:
+                break
+            if not line.strip():
+                continue
+            await inflight.acquire()  # backpressure: stop reading when too many calls are in flight
+            task = asyncio.create_task(respond(line))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def serve_stdio(self):
+        loop = asyncio.get_running_loop()
+        stdin, stdout = sys.stdin.buffer, sys.stdout.buffer
+
+        async def readline():
+            return await loop.run_in_executor(None, stdin.readline)
+
+        async def write(data):
+            stdout.write(data)
+            stdout.flush()
+
+        await self.serve(readline, write)
+
+    async def _client(self, reader, writer):
+        async def write(data):
+            writer.write(data)
+            await writer.drain()
+
+        try:
+            await self.serve(reader.readline, write)
+        finally:
+            writer.close()
+
+    async def serve_socket(self, path=None, host="127.0.0.1", port=None):
+        if path is not None:
+            if os.path.exists(path):
+                os.unlink(path)
+            server = await asyncio.start_unix_server(self._client, path=path, limit=2 ** 20)
+        else:
+            server = await asyncio.start_server(self._client, host=host, port=port, limit=2 ** 20)
+        async with server:
+            await server.serve_forever()
+
+
+def serve_metrics(port: int, host: str = "127.0.0.1"):
+    # Prometheus text endpoint (GET /metrics) on a background thread.
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.render_prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass  # stdout may be the JSON-RPC channel
+
+    httpd = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=httpd.serve_forever, name="metrics-http", daemon=True).start()
+    return httpd
+
+
+class LazyVitals:
+    # Stands in for the VitalsCache of `store_dir` (or a ShardPool when
+    # `shards` > 0); the first attribute access (or warm()) imports the store
+    # stack and builds the repository.
+    def __init__(self, store_dir, shards: int = 0):
+        self.store_dir = store_dir
+        self.shards = shards
+        self._cache = None
+        self._lock = threading.Lock()
+
+    def warm(self):
+        if self._cache is None:
+            with self._lock:
+                if self._cache is None:
+                    if self.shards > 0:
+                        from modules.shards import ShardPool
+                        cache = ShardPool(self.store_dir, self.shards)
+                    else:
+                        from modules.cache import get_cache
+                        cache = get_cache(self.store_dir)
+                    cache.patient_ids()
+                    self._cache = cache
+        return self._cache
+
+    def __getattr__(self, name):
+        return getattr(self.warm(), name)
+
+
+def build_server(store_dir=STORE_DIR, consent_db=CONSENT_DB, alerts_file=ALERTS_FILE,
+                 patients_file=PATIENTS_FILE, warm: bool = True, shards: int = 0) -> MCPServer:
+    vitals = LazyVitals(store_dir, shards)
+    if warm:
+        threading.Thread(target=vitals.warm, name="vitals-warm", daemon=True).start()
+    return MCPServer(MCPRegistry(
+        vitals=vitals,
+        patients=PatientCatalog(patients_file, vitals=vitals),
+        consent=security.ConsentManager(consent_db),
+        alerts=AlertDispatcher(FileSink(alerts_file)),
+    ))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="VitalGuard MCP server (JSON-RPC)")
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument("--stdio", action="store_true", help="serve on stdin/stdout")
+    mode.add_argument("--socket", metavar="PATH", help="serve on a unix socket")
+    mode.add_argument("--port", type=int, help="serve on 127.0.0.1:PORT")
+    parser.add_argument("--store", default=str(STORE_DIR), help="vitals store directory")
+    parser.add_argument("--consent-db", default=str(CONSENT_DB), help="consent database file")
+    parser.add_argument("--patients", default=str(PATIENTS_FILE), help="patient demographics (tab-separated)")
+    parser.add_argument("--shards", type=int, default=0, help="serve vitals from N worker processes (0: in-process)")
+    parser.add_argument("--metrics-port", type=int, help="expose Prometheus metrics at http://127.0.0.1:PORT/metrics")
+    parser.add_argument("--issue-token", metavar="SCOPES", help="issue a local token with comma-separated scopes (printed to stderr)")
+    args = parser.parse_args(argv)
+
+    server = build_server(args.store, args.consent_db, patients_file=args.patients, shards=args.shards)
+    if args.metrics_port:
+        serve_metrics(args.metrics_port)
+    if args.issue_token:
+        print(security.tokens.issue(args.issue_token.split(",")), file=sys.stderr)
+    if args.stdio:
+        asyncio.run(server.serve_stdio())
+    else:
+        asyncio.run(server.serve_socket(path=args.socket, port=args.port))
+
+
+if __name__ == "__main__":
+    main()
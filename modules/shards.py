@@ -0,0 +1,377 @@
+import argparse, atexit, contextvars, os, sys, threading, time, types, zlib
+import multiprocessing as mp
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+from modules.metrics import span
+
+# Sharded serving: patients are partitioned by a stable hash across worker
+# processes. Each worker owns the vitals cache, rolling windows and threshold
+# evaluation of its shard; clients (dashboards, the MCP server) talk to it
+# over a duplex pipe with small pickled messages. Bulk reads skip pickling:
+# the worker packs its columns into a shared-memory block and the client
+# copies them out with one memcpy per field.
+#
+# ShardPool exposes the same vitals-source surface as VitalsCache (version,
+# patient_ids, latest, history, recent, trend, ward_status, repository,
+# stats), so the app, MCPRegistry, PatientCatalog and QueryEngine accept
+# either. Everything but repository() is answered per patient (or per shard)
+# by the owning worker; repository() is the whole-ward copy for full scans.
+#
+#   python -m modules.server --stdio --shards 4
+#   python -m modules.shards --store data/vitals_store --shards 4   # load test
+
+DEFAULT_SHARDS = max(1, min(8, os.cpu_count() or 1))
+START_METHOD = "spawn"      # workers never inherit the parent's threads or locks
+EXPORT_FIELDS = ["timestamp", "heart_rate", "spo2", "bp_systolic", "bp_diastolic", "temp"]
+_ALIGN = 64
+_spawn_lock = threading.Lock()  # serializes the __main__ swap in ShardPool._spawn
+
+
+def shard_of(patient_id, n_shards: int) -> int:
+    # Stable across processes and runs (unlike hash() with PYTHONHASHSEED).
+    return zlib.crc32(str(patient_id).encode("utf-8")) % n_shards
+
+
+# ---- Worker side ----
+class _Shard:
+    # Runs inside a worker process; every public method is callable over the pipe.
+    def __init__(self, shard: int, n_shards: int, store_dir: str):
+        from modules.cache import VitalsCache
+        from modules.store import VitalsStore
+        self.shard, self.n_shards = shard, n_shards
+        self.cache = VitalsCache(VitalsStore(store_dir), owns=lambda pid: shard_of(pid, n_shards) == shard)
+        self.cache.ward_status()  # warm the latest rows and windows; histories load on demand
+        self.cache.windows()
+
+    def ping(self):
+        return os.getpid()
+
+    def patient_ids(self):
+        return list(self.cache.patient_ids())
+
+    def latest(self, patient_id):
+        return self.cache.latest(patient_id)
+
+    def latest_many(self, patient_ids):
+        return self.cache.latest_many(patient_ids)
+
+    def history(self, patient_id):
+        return self.cache.history(patient_id)
+
+    def recent(self, patient_id, seconds):
+        return self.cache.recent(patient_id, seconds)
+
+    def trend(self, patient_id, window=None):
+        return self.cache.trend(patient_id, window)
+
+    def ward_status(self):
+        return self.cache.ward_status()
+
+    def stats(self):
+        return dict(self.cache.stats(), shard=self.shard, pid=os.getpid())
+
+    def export(self, fields=None, known=None):
+        # Pack this shard's readings into a new shared-memory block. The client
+        # unlinks it after copying; only names and offsets travel over the pipe.
+        # Patients whose stamp matches `known` ({patient_id: stamp} the client
+        # already holds) are listed but not copied.
+        from modules.store import FIELDS
+        known = known or {}
+        frames = self.cache.repository().frames()
+        stamps = self.cache.stamps()
+        patients = [(pid, len(frame), stamps.get(pid)) for pid, frame in frames.items()]
+        frames = {pid: frame for pid, frame in frames.items() if stamps.get(pid) is None or known.get(pid) != stamps[pid]}
+        n = sum(len(frame) for frame in frames.values())
+        if n == 0:
+            return {"name": None, "rows": 0, "layout": [], "patients": patients}
+        layout, size = [], 0
+        for f in fields or EXPORT_FIELDS:
+            dtype = np.dtype(FIELDS[f])
+            layout.append((f, dtype.str, size))
+            size += -(-n * dtype.itemsize // _ALIGN) * _ALIGN
+        shm = shared_memory.SharedMemory(create=True, size=size)
+        try:
+            for f, dtype, offset in layout:
+                dst = np.ndarray(n, dtype=dtype, buffer=shm.buf, offset=offset)
+                pos = 0
+                for frame in frames.values():
+                    col = frame[f]
+                    dst[pos:pos + len(col)] = col.to_numpy("datetime64[ns]").view(np.int64) if f == "timestamp" else col.to_numpy()
+                    pos += len(col)
+                del dst  # release the buffer export before close()
+        finally:
+            shm.close()
+        return {"name": shm.name, "rows": n, "layout": layout, "patients": patients}
+
+
+_SHARD_METHODS = {"ping", "patient_ids", "latest", "latest_many", "history", "recent", "trend", "ward_status",
+                  "stats", "export"}
+
+
+def _worker_main(shard: int, n_shards: int, store_dir: str, conn):
+    worker = _Shard(shard, n_shards, store_dir)
+    conn.send((True, os.getpid()))  # ready
+    while True:
+        try:
+            msg = conn.recv()
+        except (EOFError, OSError):
+            break
+        if msg is None:
+            break
+        method, args = msg
+        try:
+            if method not in _SHARD_METHODS:
+                raise AttributeError(f"unknown shard method {method}")
+            reply = (True, getattr(worker, method)(*args))
+        except Exception as e:
+            reply = (False, f"{type(e).__name__}: {e}")
+        conn.send(reply)
+    conn.close()
+
+
+# ---- Client side ----
+class ShardError(RuntimeError):
+    pass
+
+
+class ShardPool:
+    def __init__(self, store_dir, n_shards: int = DEFAULT_SHARDS, start_method: str = START_METHOD):
+        from modules.store import VitalsStore
+        self.store = VitalsStore(store_dir)
+        self.n = n_shards
+        self._ctx = mp.get_context(start_method)
+        self._conns = [None] * n_shards
+        self._procs = [None] * n_shards
+        self._locks = [threading.Lock() for _ in range(n_shards)]
+        self._executor = ThreadPoolExecutor(max_workers=n_shards, thread_name_prefix="shard-io")
+        self._repo = self._repo_version = None
+        self._stamps = {}
+        self._repo_lock = threading.Lock()  # guards _repo, _repo_version and _stamps
+        self._ids = self._ids_version = None
+        self._closed = False
+        for i in range(n_shards):
+            self._spawn(i)
+        for i in range(n_shards):
+            self._ready(i)
+        atexit.register(self.close)
+
+    def _spawn(self, i):
+        parent, child = self._ctx.Pipe(duplex=True)
+        proc = self._ctx.Process(target=_worker_main, args=(i, self.n, str(self.store.root), child),
+                                 name=f"vitals-shard-{i}", daemon=True)
+        with _spawn_lock:
+            main = sys.modules.get("__main__")
+            if _worker_main.__module__ != "__main__":
+                # Under `streamlit run` __main__ is the app script, which spawn would
+                # re-execute in every worker; workers only need this module.
+                sys.modules["__main__"] = types.ModuleType("__main__")
+            try:
+                proc.start()
+            finally:
+                sys.modules["__main__"] = main
+        child.close()
+        self._conns[i], self._procs[i] = parent, proc
+
+    def _ready(self, i):
+        ok, value = self._conns[i].recv()
+        if not ok:
+            raise ShardError(f"shard {i} failed to start: {value}")
+
+    def _call(self, i, method, *args):
+        with span("shard_call", method=method), self._locks[i]:
+            for attempt in (0, 1):
+                try:
+                    self._conns[i].send((method, args))
+                    ok, value = self._conns[i].recv()
+                    break
+                except (EOFError, BrokenPipeError, ConnectionResetError):
+                    if attempt or self._closed:
+                        raise ShardError(f"shard {i} is not responding")
+                    self._spawn(i)  # worker died: restart it from the store and retry once
+                    self._ready(i)
+        if not ok:
+            raise ShardError(f"shard {i}: {value}")
+        return value
+
+    def _scatter(self, fn, items):
+        # fn over items on the I/O threads, results in item order; every task
+        # runs in a copy of the caller's context so its spans join the trace.
+        futures = [self._executor.submit(contextvars.copy_context().run, fn, item) for item in items]
+        return [f.result() for f in futures]
+
+    def _all(self, method, *args):
+        # Scatter to every shard in parallel, gather in shard order.
+        return self._scatter(lambda i: self._call(i, method, *args), range(self.n))
+
+    def shard(self, patient_id) -> int:
+        return shard_of(patient_id, self.n)
+
+    # ---- Vitals source ----
+    def version(self):
+        # The store's ingestion version is a file stat; no round trip needed.
+        return self.store.version()
+
+    def patient_ids(self):
+        version = self.version()
+        if self._ids is None or self._ids_version != version:
+            self._ids = sorted(pid for ids in self._all("patient_ids") for pid in ids)
+            self._ids_version = version
+        return self._ids
+
+    def latest(self, patient_id):
+        return self._call(self.shard(patient_id), "latest", patient_id)
+
+    def latest_many(self, patient_ids):
+        # One round trip per shard (in parallel) instead of one per patient.
+        groups = {}
+        for pid in patient_ids:
+            groups.setdefault(self.shard(pid), []).append(pid)
+        parts = self._scatter(lambda g: self._call(g[0], "latest_many", g[1]), groups.items())
+        out = {}
+        for part in parts:
+            out.update(part)
+        return out
+
+    def history(self, patient_id):
+        return self._call(self.shard(patient_id), "history", patient_id)
+
+    def recent(self, patient_id, seconds: float):
+        return self._call(self.shard(patient_id), "recent", patient_id, seconds)
+
+    def trend(self, patient_id, window: str = None):
+        return self._call(self.shard(patient_id), "trend", patient_id, window)
+
+    def ward_status(self):
+        import pandas as pd
+        parts = self._all("ward_status")
+        if not any(len(p) for p in parts):
+            return parts[0]
+        return pd.concat([p for p in parts if len(p)], ignore_index=True).sort_values("patient_id", kind="stable").reset_index(drop=True)
+
+    def stats(self):
+        return {"shards": self.n, "workers": self._all("stats")}
+
+    # ---- Bulk reads ----
+    def read_columns(self, fields=None, known=None):
+        # All readings as (patients, columns): patients is [(patient_id, rows, stamp)]
+        # for every patient, columns maps field -> numpy array holding, in patient
+        # order, the rows of those whose stamp is not in `known`. Moved via shared memory.
+        known = known or {}
+        exports = self._scatter(lambda i: self._call(i, "export", fields, {
+            pid: stamp for pid, stamp in known.items() if self.shard(pid) == i}), range(self.n))
+        names = list(fields or EXPORT_FIELDS)
+        patients, parts = [], {f: [] for f in names}
+        for ex in exports:
+            patients += ex["patients"]
+            if not ex["rows"]:
+                continue
+            shm = shared_memory.SharedMemory(name=ex["name"])
+            try:
+                for f, dtype, offset in ex["layout"]:
+                    parts[f].append(np.ndarray(ex["rows"], dtype=dtype, buffer=shm.buf, offset=offset).copy())
+            finally:
+                shm.close()
+                shm.unlink()
+        from modules.store import FIELDS
+        columns = {f: np.concatenate(parts[f]) if parts[f] else np.zeros(0, FIELDS[f]) for f in names}
+        return patients, columns
+
+    def repository(self):
+        # Whole-ward VitalsRepository for full scans (the chatbot's query index),
+        # rebuilt per data version. Only patients whose stamp changed are copied
+        # over; the others keep their frames from the previous build.
+        version = self.version()
+        with self._repo_lock:
+            if self._repo is not None and self._repo_version == version:
+                return self._repo
+            with span("vitals_load", source="shards"):
+                from modules.store import _columns_to_frame
+                from modules.repository import VitalsRepository
+                previous, known = self._repo, self._stamps
+                patients, cols = self.read_columns(known=known)
+                frames, stamps, pos = {}, {}, 0
+                for pid, n, stamp in patients:
+                    stamps[pid] = stamp
+                    if previous is not None and stamp is not None and known.get(pid) == stamp:
+                        frames[pid] = previous.history(pid)
+                        continue
+                    frames[pid] = _columns_to_frame(pid, {f: c[pos:pos + n] for f, c in cols.items()})
+                    pos += n
+                repo = VitalsRepository(frames, version, previous)
+            self._repo, self._repo_version, self._stamps = repo, version, stamps
+            return repo
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        for i, conn in enumerate(self._conns):
+            try:
+                with self._locks[i]:
+                    conn.send(None)
+            except (OSError, ValueError):
+                pass
+        for proc in self._procs:
+            proc.join(timeout=5)
+            if proc.is_alive():
+                proc.terminate()
+        for conn in self._conns:
+            conn.close()
+        self._executor.shutdown(wait=False)
+
+
+# ---- Load test ----
+def _load(source, ids, calls: int, threads: int):
+    def work(k):
+        for j in range(calls // threads):
+            pid = ids[(k * 7919 + j) % len(ids)]
+            source.latest(pid)
+            source.trend(pid)
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(threads) as ex:
+        list(ex.map(work, range(threads)))
+    return 2 * (calls // threads) * threads / (time.perf_counter() - t0)
+
+
+def _timed_ms(fn):
+    t0 = time.perf_counter()
+    out = fn()
+    return out, (time.perf_counter() - t0) * 1e3
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Sharded vitals serving: load test against one process")
+    p.add_argument("--store", required=True)
+    p.add_argument("--shards", type=int, default=DEFAULT_SHARDS)
+    p.add_argument("--calls", type=int, default=20_000)
+    p.add_argument("--threads", type=int, default=16)
+    args = p.parse_args(argv)
+
+    from modules.cache import VitalsCache
+    from modules.store import VitalsStore
+    print(f"{os.cpu_count()} CPUs, {args.shards} shards")
+    single = VitalsCache(VitalsStore(args.store))
+    _, ms = _timed_ms(single.windows)
+    ids = single.patient_ids()
+    print(f"single: loaded {len(ids)} patients in {ms:.0f} ms")
+    print(f"single: latest+trend   {_load(single, ids, args.calls, args.threads):10.0f} calls/s")
+    _, ms = _timed_ms(lambda: single.latest_many(ids))
+    print(f"single: latest_many    {ms:10.1f} ms")
+    _, ms = _timed_ms(single.ward_status)
+    print(f"single: ward status    {ms:10.1f} ms")
+
+    pool, ms = _timed_ms(lambda: ShardPool(args.store, args.shards))
+    print(f"shards: started in {ms:.0f} ms")
+    print(f"shards: latest+trend   {_load(pool, ids, args.calls, args.threads):10.0f} calls/s")
+    _, ms = _timed_ms(lambda: pool.latest_many(ids))
+    print(f"shards: latest_many    {ms:10.1f} ms")
+    _, ms = _timed_ms(pool.ward_status)
+    print(f"shards: ward status    {ms:10.1f} ms")
+    repo, ms = _timed_ms(pool.repository)
+    print(f"shards: bulk read of {repo.rows()} rows via shared memory in {ms:.1f} ms")
+    pool.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,504 @@
+import json, os, shutil, sys, threading, time
+from pathlib import Path
+import numpy as np, pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # non-POSIX: in-process locking only
+    fcntl = None
+
+# Columnar vitals store.
+#
+#   <root>/_store.json                      format marker + schema
+#   <root>/_version                         mtime bumped on every write (ingestion version)
+#   <root>/<patient_id>/_manifest.json      partitions of this patient, oldest first
+#   <root>/<patient_id>/<YYYY-MM-DD>[.g<gen>]/<field>.npy
+#   <root>/<patient_id>/_wal.<seq>.seg      append-only segment of packed records
+#
+# Every partition holds one typed array per field, sorted by timestamp, and is
+# memory-mapped on read so only the sliced rows are paged in.
+#
+# New readings are appended to the patient's write-ahead segment (cost is
+# proportional to the batch). Once a segment grows past `compact_rows` it is
+# merged into new partition directories and the manifest is swapped in with
+# os.replace, so readers always see either the old or the new snapshot.
+#
+# Rows are validated once on the way in (modules.readings): bp is split into
+# integers and temperatures are stored in °C.
+
+FORMAT_VERSION = 1
+UNITS = {"temp": "C"}
+STORE_MARKER = "_store.json"
+VERSION_FILE = "_version"
+MANIFEST = "_manifest.json"
+
+FIELDS = {
+    "timestamp": "int64",      # ns since epoch (naive wall clock, as recorded)
+    "heart_rate": "int16",
+    "spo2": "int16",
+    "bp_systolic": "int16",
+    "bp_diastolic": "int16",
+    "temp": "float32",
+}
+WAL_DTYPE = np.dtype([(f, t) for f, t in FIELDS.items()])
+JSON_COLUMNS = ["timestamp", "heart_rate", "spo2", "bp", "temp"]   # legacy vitals.json record layout
+COMPACT_ROWS = 4096
+
+
+def _to_ns(value):
+    if value is None:
+        return None
+    return int(pd.Timestamp(value).value)
+
+
+def _write_json(path: Path, payload):
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump(payload, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _write_partition(part_dir: Path, columns):
+    part_dir.mkdir(parents=True, exist_ok=True)
+    for field, dtype in FIELDS.items():
+        np.save(part_dir / f"{field}.npy", np.ascontiguousarray(columns[field], dtype=dtype))
+
+
+def _split_by_day(columns):
+    ts = columns["timestamp"]
+    days = ts.astype("datetime64[ns]").astype("datetime64[D]")
+    # ts is sorted, so each day is one contiguous run
+    bounds = np.flatnonzero(days[1:] != days[:-1]) + 1
+    starts = np.concatenate(([0], bounds))
+    stops = np.concatenate((bounds, [len(ts)]))
+    for a, b in zip(starts, stops):
+        yield str(days[a]), {k: v[a:b] for k, v in columns.items()}
+
+
+def _numeric(series):
+    return pd.to_numeric(series, errors="coerce").to_numpy(dtype=np.float64)
+
+
+def _validated(df, **extra):
+    # df: readings with either a "bp" string ("135/90") or split bp columns.
+    # Invalid rows are dropped; see modules.readings for the rules. `extra`
+    # arrays ride along and are filtered with the rows.
+    from modules.readings import split_bp, validate_columns
+    if "bp_systolic" in df and "bp_diastolic" in df:
+        sys_, dia = _numeric(df["bp_systolic"]), _numeric(df["bp_diastolic"])
+    else:
+        sys_, dia = split_bp(df["bp"].tolist())
+    columns, _ = validate_columns(dict(extra,
+        timestamp=pd.to_datetime(df["timestamp"], errors="coerce").to_numpy("datetime64[ns]").astype("int64"),
+        heart_rate=_numeric(df["heart_rate"]),
+        spo2=_numeric(df["spo2"]),
+        bp_systolic=sys_,
+        bp_diastolic=dia,
+        temp=_numeric(df["temp"]),
+    ))
+    return columns
+
+
+def frame_to_columns(df):
+    # One patient's readings -> validated store columns sorted by timestamp.
+    columns = _validated(df)
+    order = np.argsort(columns["timestamp"], kind="stable")
+    return {k: v[order].astype(FIELDS[k]) for k, v in columns.items()}
+
+
+def frame_to_patient_columns(df):
+    # Readings of any number of patients -> {patient_id: columns}, with one
+    # validation pass over the whole frame instead of one per patient.
+    codes, pids = pd.factorize(df["patient_id"], sort=False)
+    columns = _validated(df, patient=codes)
+    patient = columns.pop("patient")
+    order = np.lexsort((columns["timestamp"], patient))
+    patient = patient[order]
+    columns = {k: v[order].astype(FIELDS[k]) for k, v in columns.items()}
+    cuts = np.flatnonzero(patient[1:] != patient[:-1]) + 1
+    return {
+        pids[patient[a]]: {k: v[a:b] for k, v in columns.items()}
+        for a, b in zip(np.concatenate(([0], cuts)), np.concatenate((cuts, [len(patient)])))
+        if b > a
+    }
+
+
+def _sort_columns(columns):
+    order = np.argsort(columns["timestamp"], kind="stable")
+    return {k: v[order] for k, v in columns.items()}
+
+
+class VitalsStore:
+    _locks = {}
+    _locks_guard = threading.Lock()
+
+    def __init__(self, root, compact_rows: int = COMPACT_ROWS):
+        self.root = Path(root)
+        self.compact_rows = compact_rows
+
+    def exists(self) -> bool:
+        return (self.root / STORE_MARKER).exists()
+
+    # ---- Mapping-style access (matches the dict returned for JSON files) ----
+    def keys(self):
+        return self.patient_ids()
+
+    def get(self, patient_id, default=None):
+        if patient_id not in self:
+            return default
+        return self.read(patient_id)
+
+    def __contains__(self, patient_id):
+        return isinstance(patient_id, str) and (self.root / patient_id / MANIFEST).exists()
+
+    def __iter__(self):
+        return iter(self.patient_ids())
+
+    def __len__(self):
+        return len(self.patient_ids())
+
+    # ---- Reads ----
+    def patient_ids(self):
+        if not self.root.is_dir():
+            return []
+        return sorted(p.name for p in self.root.iterdir() if (p / MANIFEST).exists())
+
+    def manifest(self, patient_id):
+        path = self.root / patient_id / MANIFEST
+        if not path.exists():
+            return {"partitions": []}
+        with open(path, "r") as f:
+            return json.load(f)
+
+    def _wal_segments(self, patient_id, min_seq=0):
+        pdir = self.root / patient_id
+        if not pdir.is_dir():
+            return []
+        segs = []
+        for p in pdir.glob("_wal.*.seg"):
+            seq = int(p.name.split(".")[1])
+            if seq >= min_seq:
+                segs.append((seq, p))
+        return sorted(segs)
+
+    def _read_wal(self, patient_id, min_seq=0):
+        recs = []
+        for _, path in self._wal_segments(patient_id, min_seq):
+            # a torn trailing record (crash mid-append) is ignored
+            count = path.stat().st_size // WAL_DTYPE.itemsize
+            if count:
+                recs.append(np.fromfile(path, dtype=WAL_DTYPE, count=count))
+        return np.concatenate(recs) if recs else np.empty(0, dtype=WAL_DTYPE)
+
+    def version(self) -> int:
+        # Cheap change detector for caches: one stat, bumped by every append/compaction.
+        try:
+            return os.stat(self.root / VERSION_FILE).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    def patient_stamp(self, patient_id):
+        # Identity of one patient's data: manifest snapshot plus WAL sizes.
+        wal = tuple((seq, p.stat().st_size) for seq, p in self._wal_segments(patient_id))
+        return self._manifest_stamp(patient_id), wal
+
+    def _manifest_stamp(self, patient_id):
+        try:
+            st = os.stat(self.root / patient_id / MANIFEST)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_mtime_ns)
+
+    def _read_snapshot(self, patient_id, lo, hi, fields):
+        manifest = self.manifest(patient_id)
+        chunks = {f: [] for f in fields}
+        for part in manifest["partitions"]:
+            if (lo is not None and part["end"] < lo) or (hi is not None and part["start"] > hi):
+                continue
+            part_dir = self.root / patient_id / part["name"]
+            ts = np.load(part_dir / "timestamp.npy", mmap_mode="r")
+            a = 0 if lo is None else int(np.searchsorted(ts, lo, side="left"))
+            b = len(ts) if hi is None else int(np.searchsorted(ts, hi, side="right"))
+            if a >= b:
+                continue
+            for f in fields:
+                arr = ts if f == "timestamp" else np.load(part_dir / f"{f}.npy", mmap_mode="r")
+                chunks[f].append(arr[a:b])
+
+        wal = self._read_wal(patient_id, manifest.get("wal_seq", 0))
+        if len(wal):
+            keep = np.ones(len(wal), dtype=bool)
+            if lo is not None:
+                keep &= wal["timestamp"] >= lo
+            if hi is not None:
+                keep &= wal["timestamp"] <= hi
+            wal = wal[keep]
+        return chunks, wal
+
+    def read_columns(self, patient_id, start=None, end=None, fields=None):
+        fields = list(fields or FIELDS)
+        lo, hi = _to_ns(start), _to_ns(end)
+        # Optimistic read: retry if a compaction swapped the manifest under us.
+        for _ in range(5):
+            stamp = self._manifest_stamp(patient_id)
+            try:
+                chunks, wal = self._read_snapshot(patient_id, lo, hi, fields)
+            except FileNotFoundError:
+                continue
+            if self._manifest_stamp(patient_id) == stamp:
+                break
+        else:
+            with self._lock(patient_id):
+                chunks, wal = self._read_snapshot(patient_id, lo, hi, fields)
+
+        if len(wal):
+            for f in fields:
+                chunks[f].append(wal[f])
+        columns = {
+            f: np.concatenate(c) if c else np.empty(0, dtype=FIELDS[f])
+            for f, c in chunks.items()
+        }
+        if len(wal) and "timestamp" in columns:
+            columns = _sort_columns(columns)
+        return columns
+
+    def read(self, patient_id, start=None, end=None):
+        cols = self.read_columns(patient_id, start, end)
+        return _columns_to_frame(patient_id, cols)
+
+    def tail(self, patient_id, seconds: float = 0.0):
+        # Readings within `seconds` of the patient's newest one. Only the newest
+        # partitions (found from the manifest) and the WAL are paged in.
+        manifest = self.manifest(patient_id)
+        wal = self._read_wal(patient_id, manifest.get("wal_seq", 0))
+        ends = [p["end"] for p in manifest["partitions"][-1:]] + ([int(wal["timestamp"].max())] if len(wal) else [])
+        if not ends:
+            return _columns_to_frame(patient_id, {f: np.empty(0, dtype=t) for f, t in FIELDS.items()})
+        span_ns = int(seconds * 1e9)
+        cols = self.read_columns(patient_id, start=max(ends) - span_ns)
+        ts = cols["timestamp"]
+        if len(ts) and ts[0] < ts[-1] - span_ns:  # newer rows arrived since the manifest read
+            cols = {f: v[int(np.searchsorted(ts, ts[-1] - span_ns, side="left")):] for f, v in cols.items()}
+        return _columns_to_frame(patient_id, cols)
+
+    def read_all(self, start=None, end=None):
+        frames = [self.read(pid, start, end) for pid in self.patient_ids()]
+        frames = [f for f in frames if len(f)]
+        if not frames:
+            return pd.DataFrame([])
+        return pd.concat(frames, ignore_index=True)
+
+    # ---- Writes ----
+    def init(self):
+        if not self.exists():
+            self.root.mkdir(parents=True, exist_ok=True)
+            _write_json(self.root / STORE_MARKER, {"format": FORMAT_VERSION, "fields": FIELDS, "units": UNITS})
+        return self
+
+    def _bump_version(self):
+        path = self.root / VERSION_FILE
+        now = time.time_ns()
+        try:
+            now = max(now, os.stat(path).st_mtime_ns + 1)
+        except FileNotFoundError:
+            path.touch()
+        os.utime(path, ns=(now, now))
+
+    def _lock(self, patient_id):
+        key = (str(self.root.resolve()), patient_id)
+        with VitalsStore._locks_guard:
+            lock = VitalsStore._locks.setdefault(key, threading.Lock())
+        return _PatientLock(lock, self.root / patient_id / "_lock")
+
+    def _patient_dir(self, patient_id):
+        # Write paths only: the id becomes a directory name under root.
+        from modules.readings import valid_patient_id
+        if not valid_patient_id(patient_id):
+            raise ValueError(f"invalid patient id {patient_id!r}")
+        return self.root / patient_id
+
+    def write_patient(self, patient_id, columns):
+        pdir = self._patient_dir(patient_id)
+        partitions = []
+        for day, part in _split_by_day(columns):
+            _write_partition(pdir / day, part)
+            partitions.append(_partition_entry(day, day, part))
+        _write_json(pdir / MANIFEST, {"generation": 0, "wal_seq": 0, "partitions": partitions})
+
+    def append(self, patient_id, columns):
+        # Append a batch of readings for one patient; O(len(batch)).
+        return self.append_many({patient_id: columns})
+
+    def append_many(self, batches):
+        # batches: {patient_id: columns}; the store version is bumped once per call.
+        total = 0
+        for patient_id, columns in batches.items():
+            total += self._append_one(patient_id, columns)
+        if total:
+            self._bump_version()
+        return total
+
+    def _append_one(self, patient_id, columns):
+        n = len(columns["timestamp"])
+        if n == 0:
+            return 0
+        pdir = self._patient_dir(patient_id)
+        recs = np.empty(n, dtype=WAL_DTYPE)
+        for f in FIELDS:
+            recs[f] = columns[f]
+        pdir.mkdir(parents=True, exist_ok=True)
+        with self._lock(patient_id):
+            manifest = self.manifest(patient_id)
+            if not (pdir / MANIFEST).exists():
+                _write_json(pdir / MANIFEST, manifest)
+            segs = self._wal_segments(patient_id, manifest.get("wal_seq", 0))
+            seg = segs[-1][1] if segs else pdir / f"_wal.{manifest.get('wal_seq', 0)}.seg"
+            with open(seg, "ab") as f:
+                # drop a torn tail left by an earlier crash so records stay aligned
+                size = f.tell()
+                if size % WAL_DTYPE.itemsize:
+                    f.truncate(size - size % WAL_DTYPE.itemsize)
+                f.write(recs.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            if seg.stat().st_size // WAL_DTYPE.itemsize >= self.compact_rows:
+                self._compact_locked(patient_id)
+        return n
+
+    def append_frame(self, df):
+        # Append a DataFrame of new readings (any number of patients).
+        self.init()
+        return self.append_many(frame_to_patient_columns(df))
+
+    def compact(self, patient_id=None):
+        pids = [patient_id] if patient_id is not None else self.patient_ids()
+        merged = 0
+        for pid in pids:
+            with self._lock(pid):
+                merged += self._compact_locked(pid)
+        if merged:
+            self._bump_version()
+        return merged
+
+    def _compact_locked(self, patient_id):
+        pdir = self.root / patient_id
+        manifest = self.manifest(patient_id)
+        segs = self._wal_segments(patient_id, manifest.get("wal_seq", 0))
+        if not segs:
+            return 0
+        wal = self._read_wal(patient_id, manifest.get("wal_seq", 0))
+        generation = manifest.get("generation", 0) + 1
+        by_day = {p.get("day", p["name"]): p for p in manifest["partitions"]}
+        superseded = []
+
+        if len(wal):
+            wal_cols = _sort_columns({f: wal[f] for f in FIELDS})
+            for day, chunk in _split_by_day(wal_cols):
+                old = by_day.get(day)
+                if old is not None:
+                    old_dir = pdir / old["name"]
+                    merged = {f: np.concatenate([np.load(old_dir / f"{f}.npy"), chunk[f]]) for f in FIELDS}
+                    chunk = _sort_columns(merged)
+                    superseded.append(old_dir)
+                name = f"{day}.g{generation}"
+                _write_partition(pdir / name, chunk)
+                by_day[day] = _partition_entry(name, day, chunk)
+
+        partitions = sorted(by_day.values(), key=lambda p: p["start"])
+        _write_json(pdir / MANIFEST, {
+            "generation": generation,
+            "wal_seq": segs[-1][0] + 1,
+            "partitions": partitions,
+        })
+        # Readers that opened the old files keep their mappings; new readers see the new manifest.
+        for _, path in segs:
+            path.unlink(missing_ok=True)
+        for d in superseded:
+            shutil.rmtree(d, ignore_errors=True)
+        return len(wal)
+
+
+class _PatientLock:
+    # Thread lock plus an advisory file lock so separate writer processes serialize too.
+    def __init__(self, lock, path: Path):
+        self._lock = lock
+        self._path = path
+        self._fh = None
+
+    def __enter__(self):
+        self._lock.acquire()
+        if fcntl is not None:
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            self._fh = open(self._path, "a")
+            fcntl.flock(self._fh, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self._fh is not None:
+            fcntl.flock(self._fh, fcntl.LOCK_UN)
+            self._fh.close()
+            self._fh = None
+        self._lock.release()
+
+
+def _partition_entry(name, day, columns):
+    return {
+        "name": name,
+        "day": day,
+        "rows": int(len(columns["timestamp"])),
+        "start": int(columns["timestamp"][0]),
+        "end": int(columns["timestamp"][-1]),
+    }
+
+
+def _columns_to_frame(patient_id, cols):
+    # Numeric columns only; the "135/90" display form is built per latest reading
+    # (VitalsRepository.latest / latest_frame), not per stored row.
+    n = len(cols["timestamp"])
+    return pd.DataFrame({
+        "patient_id": np.full(n, patient_id, dtype=object),
+        "timestamp": cols["timestamp"].astype("datetime64[ns]"),
+        "heart_rate": cols["heart_rate"],
+        "spo2": cols["spo2"],
+        "bp_systolic": cols["bp_systolic"],
+        "bp_diastolic": cols["bp_diastolic"],
+        "temp": cols["temp"].astype("float64").round(2),
+    })
+
+
+def convert_json(json_path, store_dir):
+    # One-shot conversion of the legacy {patient_id: [records]} JSON layout.
+    # The store is built next to its final location and swapped in with a rename.
+    json_path, store_dir = Path(json_path), Path(store_dir)
+    with open(json_path, "r") as f:
+        raw = json.load(f)
+
+    tmp = store_dir.with_name(store_dir.name + ".converting")
+    shutil.rmtree(tmp, ignore_errors=True)
+    store = VitalsStore(tmp).init()
+    ids = [pid for pid, records in raw.items() if records]
+    df = pd.DataFrame.from_records([r for pid in ids for r in raw[pid]], columns=JSON_COLUMNS)
+    df["patient_id"] = np.repeat(np.array(ids, dtype=object), [len(raw[pid]) for pid in ids])
+    for patient_id, columns in frame_to_patient_columns(df).items():
+        store.write_patient(patient_id, columns)
+    store._bump_version()
+
+    if store_dir.exists():
+        old = store_dir.with_name(store_dir.name + ".old")
+        shutil.rmtree(old, ignore_errors=True)
+        os.replace(store_dir, old)
+        os.replace(tmp, store_dir)
+        shutil.rmtree(old, ignore_errors=True)
+    else:
+        os.replace(tmp, store_dir)
+    return VitalsStore(store_dir)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("usage: python -m modules.store <vitals.json> <store_dir>")
+        sys.exit(2)
+    s = convert_json(sys.argv[1], sys.argv[2])
+    print(f"Converted {len(s)} patients into {s.root}")
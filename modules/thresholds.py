@@ -0,0 +1,71 @@
+import numpy as np, pandas as pd
+from modules.metrics import span
+
+OK, WARNING, CRITICAL = 0, 1, 2
+
+# Declarative limits, one row per vital. "below" rules fire when value < limit,
+# "above" rules when value > limit.
+THRESHOLDS = [
+    # vital,       direction, warning, critical, warning message,            critical message
+    ("spo2",       "below",   95,      90,       "Low SpO₂ detected",         "🚨 CRITICAL: SpO₂ dangerously low!"),
+    ("heart_rate", "above",   120,     130,      "High heart rate detected",  "🚨 CRITICAL: Severe tachycardia!"),
+    ("temp",       "above",   38,      39.5,     "High fever detected",       "🚨 CRITICAL: High-grade fever!"),
+]
+VITALS = [r[0] for r in THRESHOLDS]
+
+# Alternate keys used by older payloads (e.g. MCP patient dicts).
+ALIASES = {"temperature": "temp"}
+
+_SIGN = np.array([-1.0 if r[1] == "below" else 1.0 for r in THRESHOLDS])
+_WARN = np.array([r[2] for r in THRESHOLDS], dtype=float) * _SIGN
+_CRIT = np.array([r[3] for r in THRESHOLDS], dtype=float) * _SIGN
+_MESSAGES = {
+    WARNING: [r[4] for r in THRESHOLDS],
+    CRITICAL: [r[5] for r in THRESHOLDS],
+}
+
+
+def _levels(values: np.ndarray) -> np.ndarray:
+    # values: (n, len(VITALS)) float array; NaN means "not measured" and never alerts
+    signed = values * _SIGN
+    levels = (signed > _WARN).astype(np.int8)
+    levels[signed > _CRIT] = CRITICAL
+    return levels
+
+
+def evaluate(frame: pd.DataFrame) -> pd.DataFrame:
+    # Alert matrix: one int8 level (OK/WARNING/CRITICAL) per row and vital.
+    with span("threshold_eval", scope="frame"):
+        values = np.column_stack([
+            pd.to_numeric(frame[v], errors="coerce").to_numpy(dtype=float) if v in frame else np.full(len(frame), np.nan)
+            for v in VITALS
+        ]) if len(frame) else np.empty((0, len(VITALS)))
+        return pd.DataFrame(_levels(values), index=frame.index, columns=VITALS)
+
+
+def ward_status(latest: pd.DataFrame) -> pd.DataFrame:
+    # latest: one row per patient. Adds per-vital levels and the worst level in one pass.
+    levels = evaluate(latest)
+    out = latest.copy()
+    for v in VITALS:
+        out[f"{v}_level"] = levels[v].to_numpy()
+    out["level"] = levels.max(axis=1).to_numpy() if len(levels) else np.zeros(0, dtype=np.int8)
+    return out
+
+
+def check_reading(reading) -> np.ndarray:
+    # Levels for a single reading (dict or Series), same rules as evaluate().
+    with span("threshold_eval", scope="reading"):
+        get = reading.get
+        row = []
+        for v in VITALS:
+            value = get(v)
+            if value is None:
+                value = next((get(a) for a, target in ALIASES.items() if target == v and get(a) is not None), None)
+            row.append(np.nan if value is None else float(value))
+        return _levels(np.array([row], dtype=float))[0]
+
+
+def messages(levels, level: int = WARNING):
+    # The `level` message of every vital whose level is at or above it.
+    return [_MESSAGES[level][i] for i, lv in enumerate(levels) if lv >= level]
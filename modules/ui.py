@@ -1,3 +1,4 @@
+import html
 import streamlit as st
 
 def hero(title: str, subtitle: str, badge: str=None):
@@ -27,3 +28,28 @@ def success_toast(msg: str):
 
 def warn_toast(msg: str):
     st.warning(msg)  
+
+def _ward_cell(pid, hr, spo2, bp, temp, level, changed):
+    cls = f"vg-cell lvl-{level}" + (" changed" if changed else "")
+    return (f"<div class='{cls}'><b>{html.escape(str(pid))}</b><br/>"
+            f"HR {hr} · SpO₂ {spo2}<br/>BP {html.escape(str(bp))} · T {temp}</div>")
+
+def ward_grid(status, previous=None, container=None):
+    # status: one row per patient (see thresholds.ward_status); the whole ward is sent
+    # as one markdown element per rerun (Streamlit re-sends every element the script
+    # runs, so there is no per-cell repaint to be had). Cells whose values changed
+    # since `previous` get a one-shot highlight. Returns the value map to pass back
+    # as `previous`.
+    target = container if container is not None else st
+    previous = previous or {}
+    if status.empty:
+        target.caption("No patients yet.")
+        return {}
+    cols = [status[c].tolist() for c in ("patient_id", "heart_rate", "spo2", "bp", "temp", "level")]
+    current, cells = {}, []
+    for pid, hr, spo2, bp, temp, level in zip(*cols):
+        sig = (hr, spo2, bp, temp, int(level))
+        current[pid] = sig
+        cells.append(_ward_cell(pid, hr, spo2, bp, temp, int(level), pid in previous and previous[pid] != sig))
+    target.markdown("<div class='vg-ward'>" + "".join(cells) + "</div>", unsafe_allow_html=True)
+    return current
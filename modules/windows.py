@@ -0,0 +1,204 @@
+import threading
+from collections import deque
+import numpy as np
+
+# Incremental sliding-window statistics per patient. Each new reading updates
+# running sums (mean, least-squares slope) and monotonic deques (min/max) in
+# amortized O(1); readings older than the window are evicted as time advances.
+# Windows end at each patient's newest reading, not at wall-clock time.
+
+WINDOWS = {"30m": 30 * 60, "6h": 6 * 3600}   # name -> seconds
+STAT_FIELDS = ["heart_rate", "spo2", "bp_systolic", "temp"]
+_REBASE_AFTER = 86_400.0                       # seconds; keeps the slope sums well conditioned
+
+
+class RollingStats:
+    def __init__(self, window: float):
+        self.window = window
+        self._points = deque()     # (t, v), t in seconds since self._origin
+        self._min = deque()        # increasing values
+        self._max = deque()        # decreasing values
+        self._origin = None
+        self._n = 0
+        self._st = self._sv = self._stt = self._stv = 0.0
+
+    def _rebase(self, origin):
+        shift = origin - self._origin
+        self._points = deque((t - shift, v) for t, v in self._points)
+        self._min = deque((t - shift, v) for t, v in self._min)
+        self._max = deque((t - shift, v) for t, v in self._max)
+        self._origin = origin
+        self._st = sum(t for t, _ in self._points)
+        self._sv = sum(v for _, v in self._points)
+        self._stt = sum(t * t for t, _ in self._points)
+        self._stv = sum(t * v for t, v in self._points)
+
+    def add(self, ts: float, value: float):
+        # ts: epoch seconds, expected non-decreasing per series
+        if self._origin is None:
+            self._origin = ts
+        elif ts - self._origin > _REBASE_AFTER:
+            self._rebase(ts - self.window)
+        t = ts - self._origin
+        self._points.append((t, value))
+        self._n += 1
+        self._st += t; self._sv += value; self._stt += t * t; self._stv += t * value
+        while self._min and self._min[-1][1] >= value:
+            self._min.pop()
+        self._min.append((t, value))
+        while self._max and self._max[-1][1] <= value:
+            self._max.pop()
+        self._max.append((t, value))
+
+        cutoff = t - self.window
+        while self._points and self._points[0][0] < cutoff:
+            old_t, old_v = self._points.popleft()
+            self._n -= 1
+            self._st -= old_t; self._sv -= old_v; self._stt -= old_t * old_t; self._stv -= old_t * old_v
+        while self._min[0][0] < cutoff:
+            self._min.popleft()
+        while self._max[0][0] < cutoff:
+            self._max.popleft()
+
+    def summary(self):
+        n = self._n
+        if n == 0:
+            return {"n": 0, "mean": None, "min": None, "max": None, "slope_per_min": None}
+        denom = n * self._stt - self._st * self._st
+        slope = (n * self._stv - self._st * self._sv) / denom * 60.0 if n > 1 and denom > 1e-9 else 0.0
+        return {
+            "n": n,
+            "mean": round(self._sv / n, 2),
+            "min": self._min[0][1],
+            "max": self._max[0][1],
+            "slope_per_min": round(slope, 4),
+        }
+
+
+# ---- Early-warning score (NEWS2-style bands for the fields we record) ----
+_EWS_BANDS = {
+    # field:        (upper edges of each band, points per band)
+    "heart_rate":   ([40, 50, 90, 110, 130], [3, 1, 0, 1, 2, 3]),
+    "spo2":         ([91, 93, 95], [3, 2, 1, 0]),
+    "bp_systolic":  ([90, 100, 110, 219], [3, 2, 1, 0, 3]),
+    "temp":         ([35.0, 36.0, 38.0, 39.0], [3, 1, 0, 1, 2]),
+}
+
+
+def early_warning_score(heart_rate, spo2, bp_systolic, temp):
+    # Vectorized: accepts scalars or arrays, returns the summed band points. temp in °C.
+    values = {"heart_rate": heart_rate, "spo2": spo2, "bp_systolic": bp_systolic, "temp": temp}
+    score = 0
+    for field, (edges, points) in _EWS_BANDS.items():
+        v = np.asarray(values[field], dtype=float)
+        score = score + np.asarray(points)[np.digitize(v, edges, right=True)]
+    return score
+
+
+class PatientWindows:
+    def __init__(self, windows):
+        self.stats = {name: {f: RollingStats(sec) for f in STAT_FIELDS} for name, sec in windows.items()}
+        self.horizon_ns = int(max(windows.values()) * 1e9)
+        self.seen = deque()        # ns timestamps of the readings inside the longest window
+        self.last_ts = None
+        self.latest = None
+
+    @property
+    def last_ns(self):
+        return self.seen[-1] if self.seen else None
+
+    def add(self, ts_ns: int, reading):
+        ts = ts_ns / 1e9
+        for per_field in self.stats.values():
+            for f, rs in per_field.items():
+                rs.add(ts, float(reading[f]))
+        self.seen.append(ts_ns)
+        while self.seen[0] < ts_ns - self.horizon_ns:
+            self.seen.popleft()
+        self.last_ts = ts
+        self.latest = {f: reading[f] for f in STAT_FIELDS}
+
+
+class WindowEngine:
+    def __init__(self, windows=None):
+        self.windows = dict(windows or WINDOWS)
+        self._patients = {}
+        self._lock = threading.Lock()
+
+    def _feed(self, pw, ts_ns, columns):
+        # ts_ns: int64 ns timestamps, non-decreasing; columns: field -> values. Caller holds the lock.
+        vals = {f: np.asarray(columns[f]).tolist() for f in STAT_FIELDS}
+        for i, t in enumerate(ts_ns.tolist()):
+            pw.add(t, {f: vals[f][i] for f in STAT_FIELDS})
+
+    def update(self, patient_id, ts: float, reading):
+        # O(1) amortized per reading. Readings must come in timestamp order; an
+        # older one is ignored here and picked up by the next sync()'s rebuild.
+        ts_ns = int(round(ts * 1e9))
+        with self._lock:
+            pw = self._patients.get(patient_id)
+            if pw is None:
+                pw = self._patients[patient_id] = PatientWindows(self.windows)
+            if pw.last_ns is not None and ts_ns < pw.last_ns:
+                return
+            pw.add(ts_ns, reading)
+
+    @property
+    def horizon(self):
+        return max(self.windows.values())
+
+    def resume_from(self, patient_id):
+        # Earliest timestamp (ns) sync() needs to reconcile patient_id; None means
+        # the patient is new and its newest `horizon` seconds are enough.
+        with self._lock:
+            pw = self._patients.get(patient_id)
+            return None if pw is None or pw.last_ns is None else pw.last_ns - pw.horizon_ns
+
+    def sync(self, patient_id, frame):
+        # Reconcile one patient with a timestamp-sorted frame of its readings that
+        # starts at resume_from(). Rows are matched by count, not timestamp: if the
+        # frame holds exactly the rows the longest window has seen up to its newest
+        # reading, only the rows after those are fed; otherwise a late or
+        # same-timestamp reading landed inside the window and the patient's
+        # windows are rebuilt from the frame.
+        if frame.empty:
+            return
+        ts = frame["timestamp"].to_numpy("datetime64[ns]").astype(np.int64)
+        with self._lock:
+            pw = self._patients.get(patient_id)
+            start = None
+            if pw is not None and pw.seen:
+                lo = int(np.searchsorted(ts, pw.last_ns - pw.horizon_ns, side="left"))
+                hi = int(np.searchsorted(ts, pw.last_ns, side="right"))
+                if hi - lo == len(pw.seen):
+                    start = hi
+            if start is None:
+                pw = self._patients[patient_id] = PatientWindows(self.windows)
+                start = int(np.searchsorted(ts, ts[-1] - pw.horizon_ns, side="left"))
+            if start < len(ts):
+                self._feed(pw, ts[start:], {f: frame[f].to_numpy()[start:] for f in STAT_FIELDS})
+
+    def extend(self, patient_id, columns):
+        # Append path: feed a batch just written to the store (timestamp in ns)
+        # when it continues a known patient's series, i.e. starts after the newest
+        # reading seen. Anything else (a new patient, a late or same-timestamp
+        # row, a batch sync() already replayed) is left to the next sync().
+        ts = np.asarray(columns["timestamp"]).astype(np.int64)
+        if not len(ts) or (np.diff(ts) < 0).any():
+            return
+        with self._lock:
+            pw = self._patients.get(patient_id)
+            if pw is None or pw.last_ns is None or ts[0] <= pw.last_ns:
+                return
+            self._feed(pw, ts, columns)
+
+    def trend(self, patient_id, window: str = None):
+        # {"window", "stats": {field: summary}, "ews": score of the latest reading}
+        window = window or next(iter(self.windows))
+        with self._lock:
+            pw = self._patients.get(patient_id)
+            if pw is None or window not in pw.stats:
+                return None
+            stats = {f: rs.summary() for f, rs in pw.stats[window].items()}
+            latest = pw.latest
+        return {"window": window, "stats": stats, "ews": int(early_warning_score(**latest))}
@@ -0,0 +1,26 @@
+import time
+from modules.alerts import FULL, QUEUED, AlertDispatcher, LoopbackSink
+
+
+def _wait(cond, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not cond() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert cond()
+
+
+def test_backlog_is_bounded_while_rate_limited():
+    sink = LoopbackSink()
+    d = AlertDispatcher(sink, rate=1, period=3600, batch_interval=3600, queue_size=3)
+    try:
+        assert [d.submit("P1", "hr", dedup=False) for _ in range(4)] == [QUEUED] * 3 + [FULL]
+        d.flush()
+        _wait(lambda: len(sink.alerts) == 1)
+        assert [d.submit("P1", "hr", dedup=False) for _ in range(4)] == [QUEUED] * 3 + [FULL]
+        d.flush()
+        _wait(lambda: d._queue.qsize() == 2 and d.pending() == 5)
+        assert d._backlogged == 3
+        assert len(sink.alerts) == 1 and d.stats["dropped"] == 2
+    finally:
+        d._stop.set()
+        d._wake.set()
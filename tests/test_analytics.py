@@ -0,0 +1,10 @@
+from modules.analytics import AuditLog
+
+
+def test_trace_ids_round_trip():
+    log = AuditLog(capacity=8)
+    ids = ["0000abcd", "req-42", "ABCDEF12", "f" * 32, None]
+    returned = [log.add("read", "P1", "ok", ["vitals:read"], trace_id=t) for t in ids]
+    assert returned[:4] == ids[:4]
+    assert len(returned[4]) == 8
+    assert log.as_dataframe()["trace_id"].tolist() == returned
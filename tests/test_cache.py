@@ -0,0 +1,76 @@
+from modules.cache import VitalsCache
+from modules.store import VitalsStore
+from tests.test_store import _columns
+
+
+def _cache(tmp_path, max_bytes=1):
+    store = VitalsStore(tmp_path / "store", compact_rows=64).init()
+    for i, pid in enumerate(["P1", "P2", "P3"]):
+        store.append(pid, _columns(i * 100, 100))
+    return store, VitalsCache(store, max_bytes=max_bytes)
+
+
+def test_latest_and_ward_status_do_not_load_histories(tmp_path):
+    store, cache = _cache(tmp_path)
+    status = cache.ward_status()
+    assert status["patient_id"].tolist() == ["P1", "P2", "P3"]
+    assert cache.latest("P2")["timestamp"] == store.read("P2")["timestamp"].iloc[-1]
+    assert len(cache.recent("P3", 10 * 60)) == 11
+    assert cache.stats()["partitions"] == 0
+
+
+def test_histories_are_evicted_over_budget(tmp_path):
+    store, cache = _cache(tmp_path)
+    for pid in cache.patient_ids():
+        assert len(cache.history(pid)) == 100
+    stats = cache.stats()
+    assert stats["partitions"] == 1 and stats["evictions"] == 2
+
+
+def test_only_changed_patients_are_reread(tmp_path):
+    store, cache = _cache(tmp_path, max_bytes=1 << 30)
+    before = cache.repository()
+    store.append("P2", _columns(500, 1))
+    after = cache.repository()
+    assert [after.history(p) is before.history(p) for p in after.patient_ids()] == [True, False, True]
+    assert cache.latest("P2")["heart_rate"] == _columns(500, 1)["heart_rate"][0]
+
+
+def _row(minute, heart_rate):
+    cols = _columns(minute, 1)
+    cols["heart_rate"][0] = heart_rate
+    return cols
+
+
+def _check_trend(cache, pid):
+    recent = cache.recent(pid, 30 * 60)
+    stats = cache.trend(pid, "30m")["stats"]["heart_rate"]
+    assert stats["n"] == len(recent)
+    assert stats["max"] == recent["heart_rate"].max()
+
+
+def test_windows_rebuild_on_late_and_same_timestamp_rows(tmp_path):
+    store, cache = _cache(tmp_path, max_bytes=1 << 30)
+    _check_trend(cache, "P1")
+    store.append("P1", _row(95, 200))   # late: inside the window, before the newest reading
+    _check_trend(cache, "P1")
+    store.append("P1", _row(99, 40))    # same timestamp as the newest reading
+    _check_trend(cache, "P1")
+    store.append("P1", _row(100, 70))   # in order: extends without a rebuild
+    _check_trend(cache, "P1")
+
+
+def test_ingested_batches_count_once(tmp_path):
+    store, cache = _cache(tmp_path, max_bytes=1 << 30)
+    cache.windows()
+    for batch in (_row(100, 150), _row(100, 151), _row(98, 152)):
+        store.append("P1", batch)
+        cache.ingested({"P1": batch})
+        _check_trend(cache, "P1")
+
+
+def test_empty_ward_status_has_every_column(tmp_path):
+    cache = VitalsCache(VitalsStore(tmp_path / "store").init())
+    status = cache.ward_status()
+    assert status.empty
+    assert {"patient_id", "heart_rate", "spo2", "bp", "temp", "level"} <= set(status.columns)
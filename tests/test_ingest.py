@@ -0,0 +1,56 @@
+import json
+import pandas as pd
+import pytest
+from modules.ingest import IngestionPipeline, LocalBroker, normalize
+from modules.store import VitalsStore
+
+READING = {"timestamp": "2025-08-22 09:00:00", "heart_rate": 80, "spo2": 97, "bp": "120/80", "temp": 36.8}
+
+
+@pytest.mark.parametrize("patient_id", ["../escaped", "a/b", "", "P 1", "x" * 65])
+def test_unsafe_patient_ids_are_rejected(patient_id):
+    assert normalize("vitals/P001", json.dumps(dict(READING, patient_id=patient_id))) is None
+
+
+def test_topic_fallback_id_is_validated():
+    assert normalize("vitals/..", json.dumps(READING)) is None
+    assert normalize("vitals/P001", json.dumps(READING))[0] == "P001"
+
+
+def test_store_refuses_unsafe_ids(tmp_path):
+    store = VitalsStore(tmp_path / "store").init()
+    with pytest.raises(ValueError):
+        store.append_frame(pd.DataFrame([dict(READING, patient_id="../escaped")]))
+    assert not (tmp_path / "escaped").exists()
+
+
+def test_pipeline_survives_bad_messages_and_failed_batches(tmp_path, monkeypatch):
+    broker = LocalBroker()
+    store = VitalsStore(tmp_path / "store")
+    pipeline = IngestionPipeline(broker, store, batch_size=1, queue_size=4)
+    real_write = store.append_many
+    calls = []
+
+    def flaky(batches):
+        calls.append(batches)
+        if len(calls) == 1:
+            raise OSError("disk full")
+        return real_write(batches)
+
+    monkeypatch.setattr(store, "append_many", flaky)
+    monkeypatch.setattr("modules.ingest.normalize", lambda topic, payload: 1 / 0 if payload == b"boom" else normalize(topic, payload))
+    pipeline.start()
+    broker.publish("vitals/P001", json.dumps(READING), timeout=5)
+    for payload in [b"boom", json.dumps(dict(READING, temp=None)), json.dumps(dict(READING, patient_id="../x"))]:
+        broker.publish("vitals/P001", payload, timeout=5)
+    for i in range(10):  # more than queue_size: publishers would block if the consumer had died
+        broker.publish("vitals/P002", json.dumps(dict(READING, heart_rate=70 + i)), timeout=5)
+    pipeline.stop()
+
+    assert pipeline.stats["received"] == 14
+    assert pipeline.stats["errors"] == 2           # the raising normalize and the failed first batch
+    assert pipeline.stats["rejected"] == 3
+    assert pipeline.stats["lost"] == 1
+    assert pipeline.stats["written"] == pipeline.stats["accepted"] - pipeline.stats["lost"]
+    assert store.patient_ids() == ["P002"]
+    assert len(store.read("P002")) == 10
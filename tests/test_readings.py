@@ -0,0 +1,43 @@
+import json
+import numpy as np
+import pytest
+from modules.ingest import normalize
+from modules.readings import TS_MAX, TS_MIN, validate_columns
+
+BASE = {"patient_id": "P001", "heart_rate": 80, "spo2": 97, "bp": "120/80", "temp": 36.8}
+T_S = 1_755_853_200   # 2025-08-22 09:00:00
+
+
+@pytest.mark.parametrize("extra", [
+    {"temp": None},
+    {"temp": [36.8]},
+    {"temp": {"c": 36.8}},
+    {"bp": None},
+    {"heart_rate": None},
+    {"timestamp": [T_S]},
+    {"timestamp": True},
+    {"timestamp": "garbage"},
+    {"timestamp": 1e40},
+    {"timestamp": T_S * 10**12},       # beyond ns range
+    {"timestamp": 5},                  # 1970
+])
+@pytest.mark.parametrize("encode", [json.dumps, dict])
+def test_malformed_payloads_are_rejected_not_raised(extra, encode):
+    assert normalize("vitals/P001", encode(dict(BASE, **extra))) is None
+
+
+@pytest.mark.parametrize("ts", [T_S, T_S * 1000, T_S * 10**6, T_S * 10**9, float(T_S), "2025-08-22 09:00:00"])
+def test_timestamp_units_are_detected(ts):
+    _, row = normalize("vitals/P001", json.dumps(dict(BASE, timestamp=ts)))
+    assert row[0] == T_S * 10**9
+
+
+def test_bulk_validation_drops_out_of_range_timestamps():
+    ts = np.array([T_S * 10**9, TS_MIN - 1, TS_MAX + 1, np.iinfo(np.int64).min], dtype=np.int64)
+    n = len(ts)
+    cols, rejected = validate_columns({
+        "timestamp": ts, "heart_rate": np.full(n, 80.0), "spo2": np.full(n, 97.0),
+        "bp_systolic": np.full(n, 120.0), "bp_diastolic": np.full(n, 80.0), "temp": np.full(n, 36.8),
+    })
+    assert rejected == 3
+    assert cols["timestamp"].tolist() == [T_S * 10**9]
@@ -0,0 +1,24 @@
+import asyncio
+from modules.mcp import MCPRegistry
+from modules.server import INTERNAL_ERROR, INVALID_PARAMS, MCPServer
+
+
+def _call(server, method, params):
+    return asyncio.run(server.handle({"jsonrpc": "2.0", "id": 1, "method": method, "params": params}))
+
+
+def test_missing_params_are_invalid_params():
+    server = MCPServer(MCPRegistry())
+    for method, params, name in (("execute", {}, "tool_name"),
+                                 ("execute_batch", {"tool_name": "vitals"}, "patient_ids")):
+        error = _call(server, method, params)["error"]
+        assert error == {"code": INVALID_PARAMS, "message": f"Missing param: {name}"}
+
+
+def test_key_error_inside_a_method_is_internal():
+    server = MCPServer(MCPRegistry())
+
+    async def broken(params):
+        return {}["missing"]
+    server._methods["ping"] = broken
+    assert _call(server, "ping", {})["error"]["code"] == INTERNAL_ERROR